@@ -82,7 +82,7 @@ def create_project(db: Session, name: str, project_type: str = None, description
     # 创建默认会话
     create_default_session(db, project.id)
     
-    logger.info(f"✅ 创建项目成功: {name} ({project.id})")
+    logger.info("✅ 创建项目成功: %s (%s)", name, project.id)
     return project
 
 def get_project(db: Session, project_id: str = None, project_name: str = None) -> Optional[models.Project]:
@@ -106,6 +106,15 @@ def get_all_projects(db: Session, status: str = None) -> List[models.Project]:
         query = query.filter(models.Project.status == status)
     return query.order_by(desc(models.Project.last_active_at)).all()
 
+def get_projects_for_user(db: Session, user_id: str, status: str = None) -> List[models.Project]:
+    """获取用户参与的项目（在数据库中按成员关系过滤），按最后活跃时间排序"""
+    member_project_ids = db.query(models.ProjectMember.project_id)\
+        .filter(models.ProjectMember.user_id == user_id)
+    query = db.query(models.Project).filter(models.Project.id.in_(member_project_ids))
+    if status:
+        query = query.filter(models.Project.status == status)
+    return query.order_by(desc(models.Project.last_active_at)).all()
+
 def get_project_summary(db: Session, project_id: str = None, project_name: str = None) -> Optional[Dict[str, Any]]:
     """获取项目概要信息 - 用于快速加载，支持按ID或名称查询"""
     # 🆕 支持按项目名称或ID查询
@@ -154,20 +163,21 @@ def update_project_stats(db: Session, project_id: str):
     file_count = db.query(func.count(models.ProjectFile.id))\
         .filter(models.ProjectFile.project_id == project_id).scalar()
     
-    # 获取最后一条消息预览
-    last_message = db.query(models.ChatMessage)\
+    # 获取最后一条消息预览（只取摘要列，避免加载整条消息的完整content）
+    last_summary = db.query(models.ChatMessage.content_summary)\
         .filter(models.ChatMessage.project_id == project_id)\
         .order_by(desc(models.ChatMessage.created_at))\
-        .first()
+        .limit(1)\
+        .scalar()
     
     # 更新统计
     project.message_count = message_count or 0
     project.file_count = file_count or 0
-    project.last_message_preview = last_message.content_summary[:200] if last_message else None
+    project.last_message_preview = last_summary[:200] if last_summary else None
     project.last_active_at = datetime.utcnow()
     
     db.commit()
-    logger.info(f"🔄 更新项目统计: {project.name} - {message_count}条消息, {file_count}个文件")
+    logger.info("🔄 更新项目统计: %s - %s条消息, %s个文件", project.name, message_count, file_count)
 
 def delete_project(db: Session, project_id: str) -> bool:
     """删除项目（硬删除）- 删除项目及所有相关数据"""
@@ -181,11 +191,11 @@ def delete_project(db: Session, project_id: str) -> bool:
         # 由于设置了cascade="all, delete-orphan"，删除项目会自动删除相关的会话、消息和文件
         db.delete(project)
         db.commit()
-        logger.info(f"🗑️ 已删除项目及所有相关数据: {project_name}")
+        logger.info("🗑️ 已删除项目及所有相关数据: %s", project_name)
         return True
     except Exception as e:
         db.rollback()
-        logger.error(f"❌ 删除项目失败: {project_name} - {e}")
+        logger.error("❌ 删除项目失败: %s - %s", project_name, e)
         return False
 
 # ======================== 会话相关操作 ========================
@@ -204,12 +214,14 @@ def create_default_session(db: Session, project_id: str) -> models.ChatSession:
 
 def get_current_session(db: Session, project_id: str = None, project_name: str = None) -> Optional[models.ChatSession]:
     """获取项目的当前活跃会话 - 支持按ID或名称查询"""
-    # 🆕 如果提供project_name，先获取project_id
+    # 🆕 按名称查询时直接JOIN项目表，一次查询完成，无需先单独查出project_id
     if project_name and not project_id:
-        project = get_project_by_name(db, project_name)
-        if not project:
-            return None
-        project_id = project.id
+        return db.query(models.ChatSession)\
+            .join(models.Project, models.ChatSession.project_id == models.Project.id)\
+            .filter(and_(
+                models.Project.name == project_name,
+                models.ChatSession.is_current == True
+            )).first()
     
     return db.query(models.ChatSession)\
         .filter(and_(
@@ -285,15 +297,26 @@ def render_markdown_content(content: str) -> Tuple[str, str]:
         
         return clean_html, summary
     except Exception as e:
-        logger.error(f"Markdown渲染失败: {e}")
+        logger.error("Markdown渲染失败: %s", e)
         return content, content[:300]
 
 def save_message(db: Session, project_id: str, session_id: str, role: str, content: str, 
-                thinking_data: Dict = None, extra_data: Dict = None) -> models.ChatMessage:
-    """保存对话消息"""
-    # 获取会话内消息序号
-    message_count = db.query(func.count(models.ChatMessage.id))\
-        .filter(models.ChatMessage.session_id == session_id).scalar()
+                thinking_data: Dict = None, extra_data: Dict = None,
+                update_stats: bool = True) -> models.ChatMessage:
+    """保存对话消息
+    
+    连续保存多条消息时，可对前面的消息传 update_stats=False，只在最后一条时刷新一次项目统计
+    """
+    # 获取会话及会话内消息序号：COUNT作为标量子查询随会话一并取回，一次往返
+    message_count_query = db.query(func.count(models.ChatMessage.id))\
+        .filter(models.ChatMessage.session_id == session_id)
+    row = db.query(models.ChatSession, message_count_query.scalar_subquery())\
+        .filter(models.ChatSession.id == session_id).first()
+    if row:
+        session, message_count = row
+    else:
+        session = None
+        message_count = message_count_query.scalar()
     
     # 处理内容
     content_type = "markdown" if role == "assistant" else "text"
@@ -322,7 +345,6 @@ def save_message(db: Session, project_id: str, session_id: str, role: str, conte
     db.add(message)
     
     # 更新会话统计
-    session = db.query(models.ChatSession).filter(models.ChatSession.id == session_id).first()
     if session:
         session.message_count = message_count + 1
         session.last_message_at = datetime.utcnow()
@@ -335,9 +357,10 @@ def save_message(db: Session, project_id: str, session_id: str, role: str, conte
     db.refresh(message)
     
     # 异步更新项目统计
-    update_project_stats(db, project_id)
+    if update_stats:
+        update_project_stats(db, project_id)
     
-    logger.info(f"💬 保存消息: {role} - {len(content)}字符")
+    logger.info("💬 保存消息: %s - %d字符", role, len(content))
     return message
 
 def get_session_messages(db: Session, session_id: str, page: int = 1, limit: int = 50, 
@@ -348,8 +371,10 @@ def get_session_messages(db: Session, session_id: str, page: int = 1, limit: int
         .filter(models.ChatMessage.session_id == session_id)\
         .order_by(desc(models.ChatMessage.created_at))
     
-    # 计算总数
-    total = query.count()
+    # 计算总数：直接 COUNT 主键，避免 query.count() 包一层选出全部列（含content）并排序的子查询
+    total = db.query(func.count(models.ChatMessage.id))\
+        .filter(models.ChatMessage.session_id == session_id)\
+        .scalar()
     
     # 分页
     offset = (page - 1) * limit
@@ -406,7 +431,7 @@ def save_file_record(db: Session, project_id: str, session_id: str, original_nam
     # 更新项目统计
     update_project_stats(db, project_id)
     
-    logger.info(f"📁 保存文件记录: {original_name}")
+    logger.info("📁 保存文件记录: %s", original_name)
     return file_record
 
 def get_project_files(db: Session, project_id: str = None, project_name: str = None, session_id: str = None) -> List[models.ProjectFile]:
@@ -426,6 +451,19 @@ def get_project_files(db: Session, project_id: str = None, project_name: str = N
     
     return query.order_by(desc(models.ProjectFile.uploaded_at)).all()
 
+def get_latest_ready_pdf(db: Session, project_id: str) -> Optional[models.ProjectFile]:
+    """获取项目中最新上传且已就绪的PDF文件（由数据库筛选排序，只取一行）"""
+    return db.query(models.ProjectFile)\
+        .filter(
+            models.ProjectFile.project_id == project_id,
+            models.ProjectFile.status == "ready",
+            models.ProjectFile.minio_path.isnot(None),
+            models.ProjectFile.minio_path != "",
+            func.lower(models.ProjectFile.original_name).like("%.pdf")
+        )\
+        .order_by(desc(models.ProjectFile.uploaded_at))\
+        .first()
+
 def update_file_minio_path(db: Session, file_id: str, minio_path: str) -> bool:
     """更新文件的MinIO路径"""
     file_record = db.query(models.ProjectFile).filter(models.ProjectFile.id == file_id).first()
@@ -460,8 +498,8 @@ def init_default_data(db: Session):
     try:
         # 创建测试项目
         test_project = create_test_project(db)
-        logger.info(f"✅ 初始化默认数据完成: 测试项目 ({test_project.id})")
+        logger.info("✅ 初始化默认数据完成: 测试项目 (%s)", test_project.id)
         return test_project
     except Exception as e:
-        logger.error(f"❌ 初始化默认数据失败: {e}")
+        logger.error("❌ 初始化默认数据失败: %s", e)
         return None 
\ No newline at end of file
@@ -3,8 +3,10 @@
 """
 
 import os
+import time
 import urllib.parse
 from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DisconnectionError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -22,20 +24,35 @@ MYSQL_USER = os.getenv("MYSQL_USER", "root")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "ai_assistant_db")
 MYSQL_CHARSET = os.getenv("MYSQL_CHARSET", "utf8mb4")
-MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "10"))
+# 连接池大小默认按CPU核数计算（核数*2+1，限制在10~16之间）：下限保持原先的默认容量，
+# 上限避免大核数机器上连接数膨胀，过大的连接池只会加重MySQL侧的上下文切换
+# 溢出上限默认保持20，默认情况下单个引擎最多30~36个连接
+_DEFAULT_POOL_SIZE = min(16, max(10, (os.cpu_count() or 1) * 2 + 1))
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", str(_DEFAULT_POOL_SIZE)))
 MYSQL_MAX_OVERFLOW = int(os.getenv("MYSQL_MAX_OVERFLOW", "20"))
+# 连接借出时是否先ping一次：默认关闭，避免每次借出连接多一次网络往返；
+# 空闲断开由pool_recycle提前回收，网络闪断时SQLAlchemy会在首个报错后使失效连接整体作废并重建
+MYSQL_POOL_PRE_PING = os.getenv("MYSQL_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+# 连接最长存活秒数，到期的空闲连接在借出时被丢弃重建；应小于MySQL的wait_timeout
+MYSQL_POOL_RECYCLE = int(os.getenv("MYSQL_POOL_RECYCLE", "3600"))
+# 连接在池中空闲超过该秒数才在借出时ping校验（0表示关闭）；刚归还的热连接直接复用，不额外往返
+MYSQL_IDLE_PING_SECONDS = float(os.getenv("MYSQL_IDLE_PING_SECONDS", "30"))
 
 # 🔧 构建数据库连接URL - 对密码进行URL编码处理特殊字符
 encoded_password = urllib.parse.quote_plus(MYSQL_PASSWORD)
 DATABASE_URL = f"mysql+pymysql://{MYSQL_USER}:{encoded_password}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
 
 logger.info(f"数据库连接信息: {MYSQL_USER}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}")
+# 默认值已封顶，只对显式配置的过大连接池给出提示
+if ("MYSQL_POOL_SIZE" in os.environ or "MYSQL_MAX_OVERFLOW" in os.environ) and MYSQL_POOL_SIZE + MYSQL_MAX_OVERFLOW > 36:
+    logger.warning(f"⚠️ 数据库连接池上限较大: pool_size={MYSQL_POOL_SIZE}, max_overflow={MYSQL_MAX_OVERFLOW}，可能加重数据库负载")
 
 # 创建业务数据库引擎
 engine = create_engine(
     DATABASE_URL,
-    pool_pre_ping=True,           # 连接池预检
-    pool_recycle=3600,            # 连接回收时间
+    pool_pre_ping=MYSQL_POOL_PRE_PING,  # 连接池预检（从环境变量，默认关闭）
+    pool_recycle=MYSQL_POOL_RECYCLE,  # 连接回收时间（从环境变量）
+    pool_use_lifo=True,           # LIFO复用最近归还的热连接，冷连接留在池底等待回收
     pool_size=MYSQL_POOL_SIZE,    # 连接池大小（从环境变量）
     max_overflow=MYSQL_MAX_OVERFLOW,  # 最大溢出连接数（从环境变量）
     echo=False,                   # 生产环境关闭SQL日志
@@ -68,8 +85,9 @@ ACCOUNTS_DATABASE_URL = f"mysql+pymysql://{ACCOUNTS_USER}:{encoded_accounts_pwd}
 
 accounts_engine = create_engine(
     ACCOUNTS_DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=3600,
+    pool_pre_ping=MYSQL_POOL_PRE_PING,
+    pool_recycle=MYSQL_POOL_RECYCLE,
+    pool_use_lifo=True,
     pool_size=MYSQL_POOL_SIZE,
     max_overflow=MYSQL_MAX_OVERFLOW,
     echo=False,
@@ -79,6 +97,32 @@ accounts_engine = create_engine(
     }
 )
 
+def _register_idle_ping(db_engine):
+    """只对空闲较久的连接在借出时ping，失效则让连接池丢弃并换新连接"""
+    if MYSQL_POOL_PRE_PING or MYSQL_IDLE_PING_SECONDS <= 0:
+        return
+
+    @event.listens_for(db_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        connection_record.info["last_checkin"] = time.monotonic()
+
+    @event.listens_for(db_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        # 先读本地socket状态：已关闭的连接无需网络往返即可判定失效
+        if not getattr(dbapi_connection, "open", True):
+            raise DisconnectionError("连接已关闭")
+        last_checkin = connection_record.info.get("last_checkin")
+        if last_checkin is None or time.monotonic() - last_checkin < MYSQL_IDLE_PING_SECONDS:
+            return
+        try:
+            dbapi_connection.ping(reconnect=False)
+        except Exception as e:
+            # 抛出DisconnectionError后连接池会丢弃该连接并重新建立
+            raise DisconnectionError(f"空闲连接已失效: {e}")
+
+_register_idle_ping(engine)
+_register_idle_ping(accounts_engine)
+
 from .account_models import AccountsBase
 
 # 账户库会话工厂
@@ -116,10 +160,10 @@ def get_accounts_db():
 def test_connection():
     """测试数据库连接"""
     try:
-        db = SessionLocal()
+        # 直接借用连接探测，无需构造ORM会话；with块保证异常时也归还连接
         # 🔧 SQLAlchemy 2.0 需要显式声明文本SQL
-        db.execute(text("SELECT 1"))
-        db.close()
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
         logger.info("✅ 数据库连接测试成功")
         return True
     except Exception as e:
@@ -6,7 +6,7 @@ import os
 import logging
 from typing import Dict, Any, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import func
 from .database import SessionLocal, init_database
 from .crud import init_default_data
 
@@ -44,14 +44,11 @@ def check_database_health() -> Dict[str, Any]:
     try:
         db = get_database_session()
         try:
-            # 🔧 简单查询测试 - SQLAlchemy 2.0兼容
-            result = db.execute(text("SELECT 1")).scalar()
-            
-            # 统计数据
+            # 统计查询本身即可验证连接可用，无需额外的 SELECT 1 往返
             from .models import Project, ChatMessage, ProjectFile
-            project_count = db.query(Project).count()
-            message_count = db.query(ChatMessage).count()
-            file_count = db.query(ProjectFile).count()
+            project_count = db.query(func.count(Project.id)).scalar()
+            message_count = db.query(func.count(ChatMessage.id)).scalar()
+            file_count = db.query(func.count(ProjectFile.id)).scalar()
             
             return {
                 "status": "healthy",
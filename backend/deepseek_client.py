@@ -30,6 +30,32 @@ class DeepSeekClient:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
+        
+        # 按事件循环复用的HTTP会话，保持keep-alive连接，避免每次调用重新建立TCP/TLS连接
+        # （会话本身引用着事件循环，不能依赖弱引用自动清理；由 close() 显式关闭，已关闭循环的残留项在创建新会话时清理）
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取当前事件循环上复用的HTTP会话"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            self._prune_closed_loops()
+            session = aiohttp.ClientSession(headers=self.headers)
+            self._sessions[loop] = session
+        return session
+    
+    def _prune_closed_loops(self):
+        """丢弃已关闭事件循环上遗留的会话（循环关闭后已无法再await关闭，只能释放引用）"""
+        for loop, _ in list(self._sessions.items()):
+            if loop.is_closed():
+                self._sessions.pop(loop, None)
+    
+    async def close(self):
+        """关闭当前事件循环上的HTTP会话"""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
     
     async def chat_completion(
         self,
@@ -64,20 +90,19 @@ class DeepSeekClient:
         url = f"{self.base_url}/v1/chat/completions"
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    url,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=120)  # 2分钟超时
-                ) as response:
-                    
-                    if response.status == 200:
-                        result = await response.json()
-                        return result
-                    else:
-                        error_text = await response.text()
-                        raise Exception(f"DeepSeek API调用失败: 状态码={response.status}, 错误={error_text}")
+            session = self._get_session()
+            async with session.post(
+                url,
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=120)  # 2分钟超时
+            ) as response:
+                
+                if response.status == 200:
+                    result = await response.json()
+                    return result
+                else:
+                    error_text = await response.text()
+                    raise Exception(f"DeepSeek API调用失败: 状态码={response.status}, 错误={error_text}")
                         
         except aiohttp.ClientError as e:
             raise Exception(f"网络连接错误: {str(e)}")
@@ -121,7 +146,8 @@ class DeepSeekClient:
         model: str = "deepseek-chat",
         temperature: float = 0.1,
         max_tokens: int = 4096,
-        stream: bool = False
+        stream: bool = False,
+        loop: Optional[asyncio.AbstractEventLoop] = None
     ) -> Dict[str, Any]:
         """
         同步版本的聊天完成API
@@ -132,26 +158,31 @@ class DeepSeekClient:
             temperature: 温度参数，控制随机性
             max_tokens: 最大token数
             stream: 是否使用流式响应
+            loop: 调用方持有的事件循环（可选）；传入时复用该循环上的HTTP会话，由调用方负责关闭
             
         Returns:
             API响应结果
         """
-        import asyncio
-        
-        # 创建新的事件循环来运行异步方法
-        try:
+        # 未传入事件循环时创建临时事件循环来运行异步方法
+        own_loop = loop is None
+        if own_loop:
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
-            
+        try:
             result = loop.run_until_complete(
                 self.chat_completion(messages, model, temperature, max_tokens, stream)
             )
-            
-            loop.close()
             return result
             
         except Exception as e:
             raise Exception(f"同步聊天完成调用失败: {str(e)}")
+        finally:
+            if own_loop:
+                # 临时事件循环关闭前释放其上的会话（释放失败也要关闭事件循环）
+                try:
+                    loop.run_until_complete(self.close())
+                finally:
+                    loop.close()
     
     def get_models(self) -> List[str]:
         """
@@ -177,11 +208,15 @@ class DeepSeekClient:
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
             
-            result = loop.run_until_complete(
-                self.simple_chat("测试连接", "你是一个助手，请简短回复。")
-            )
-            
-            loop.close()
+            try:
+                loop.run_until_complete(
+                    self.simple_chat("测试连接", "你是一个助手，请简短回复。")
+                )
+            finally:
+                try:
+                    loop.run_until_complete(self.close())
+                finally:
+                    loop.close()
             return True
             
         except Exception as e:
@@ -219,6 +254,7 @@ async def test_deepseek_client():
         print(f"✅ DeepSeek测试成功")
         print(f"📝 回复: {response}")
         
+        await client.close()
         return True
         
     except Exception as e:
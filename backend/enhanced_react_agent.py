@@ -4,21 +4,69 @@ Enhanced ReAct Agent with Memory
 """
 import re
 import json
+import asyncio
 import pickle
 import os
+import functools
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 from colorama import init, Fore, Style
 from dataclasses import dataclass
 
 from deepseek_client import DeepSeekClient
-from tools import ToolRegistry, create_core_tool_registry
+from tools import ToolRegistry, create_core_tool_registry, close_api_session
 from prompts.loader import get_prompt_loader
+from json_utils import json_dumps, json_loads
 # 移除 log_thought 导入，现在使用直接 print + ThoughtLogger 拦截
 
 # 初始化colorama
 init(autoreset=True)
 
+# 预编译的LLM响应解析正则
+_THOUGHT_RE = re.compile(r'Thought:\s*(.*?)(?=\n(?:Action|Final Answer)|\Z)', re.DOTALL)
+_FINAL_ANSWER_RE = re.compile(r'Final Answer:\s*(.*)', re.DOTALL)
+_ACTION_RE = re.compile(r'Action:\s*(\w+)')
+_ACTION_INPUT_RE = re.compile(r'Action Input:\s*(.*?)(?=\n(?:Thought|Action|Final Answer|Observation)|\Z)', re.DOTALL)
+
+# 记忆检索分词：取连续的字母/数字/汉字片段，标点不再粘连在词上
+_WORD_RE = re.compile(r'\w+')
+
+# 建议重试的工具错误类型与HTTP状态码
+_RETRYABLE_ERROR_TYPES = frozenset({"timeout_error", "connection_error"})
+_RETRYABLE_HTTP_STATUS = frozenset({500, 502, 503, 504})
+
+# _process_agent_message 写入的标记键；Observation 中不含该键时无需再解析整段JSON
+_AGENT_MESSAGE_MARKER = '"_should_use_agent_message"'
+
+# 记忆/项目状态落盘的后台写线程：单线程保证写入顺序，请求路径只负责提交，不等待磁盘IO
+# （解释器退出时ThreadPoolExecutor会等待已提交的写入完成）
+_persist_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-persist")
+
+# 尚未落盘的最新快照：同一文件排队期间的多次保存合并为一次写入
+_pending_writes: Dict[str, Tuple[Any, str]] = {}
+_pending_lock = threading.Lock()
+
+def _write_pickle(path: str):
+    """将该文件最新的待写快照pickle写入磁盘（在后台写线程中执行）"""
+    with _pending_lock:
+        data, error_prefix = _pending_writes.pop(path)
+    try:
+        with open(path, 'wb') as f:
+            pickle.dump(data, f)
+    except Exception as e:
+        print(f"{error_prefix}: {e}")
+
+def _schedule_pickle_write(path: str, data: Any, error_prefix: str):
+    """登记待写快照；该文件已有排队中的写入时只替换快照，不再重复提交"""
+    with _pending_lock:
+        already_pending = path in _pending_writes
+        _pending_writes[path] = (data, error_prefix)
+    if not already_pending:
+        _persist_executor.submit(_write_pickle, path)
+
 @dataclass
 class AgentResult:
     """Agent执行结果"""
@@ -28,14 +76,26 @@ class AgentResult:
     success: bool = True
 
 class MemoryManager:
-    """记忆管理器"""
+    """记忆管理器（进程内共享，多个Agent线程并发访问，修改与快照均在锁内进行）"""
     
     def __init__(self, memory_file: str = "agent_memory.pkl"):
         self.memory_file = memory_file
+        self._lock = threading.Lock()
         self.conversation_history: List[Dict[str, Any]] = []
         self.session_summaries: List[Dict[str, Any]] = []
+        # 与session_summaries一一对应的问题关键词集合，检索时无需重复分词
+        self._session_keywords: List[frozenset] = []
         self.load_memory()
     
+    @staticmethod
+    def _extract_keywords(text: str) -> frozenset:
+        """提取用于相关性匹配的关键词集合"""
+        return frozenset(_WORD_RE.findall(text.lower()))
+    
+    def _rebuild_keyword_index(self):
+        """根据当前会话摘要重建关键词索引"""
+        self._session_keywords = [self._extract_keywords(s["problem"]) for s in self.session_summaries]
+    
     def load_memory(self):
         """加载记忆"""
         if os.path.exists(self.memory_file):
@@ -44,23 +104,23 @@ class MemoryManager:
                     data = pickle.load(f)
                     self.conversation_history = data.get("conversation_history", [])
                     self.session_summaries = data.get("session_summaries", [])
+                    self._rebuild_keyword_index()
                     print(f"加载记忆: {len(self.conversation_history)} 条对话, {len(self.session_summaries)} 个会话摘要")
             except Exception as e:
                 print(f"加载记忆失败: {e}")
                 self.conversation_history = []
                 self.session_summaries = []
+                self._session_keywords = []
     
     def save_memory(self):
-        """保存记忆"""
-        try:
+        """保存记忆（提交到后台写线程）"""
+        # 复制列表快照，避免后台序列化时与后续修改冲突
+        with self._lock:
             data = {
-                "conversation_history": self.conversation_history,
-                "session_summaries": self.session_summaries
+                "conversation_history": list(self.conversation_history),
+                "session_summaries": list(self.session_summaries)
             }
-            with open(self.memory_file, 'wb') as f:
-                pickle.dump(data, f)
-        except Exception as e:
-            print(f"保存记忆失败: {e}")
+        _schedule_pickle_write(self.memory_file, data, "保存记忆失败")
     
     def add_session(self, problem: str, solution: str, conversation: List[Dict[str, Any]]):
         """添加会话"""
@@ -71,40 +131,60 @@ class MemoryManager:
             "conversation": conversation,
             "tokens_used": sum(len(msg["content"]) for msg in conversation)
         }
-        self.session_summaries.append(session)
-        self.conversation_history.extend(conversation)
-        
-        # 限制记忆大小
-        if len(self.session_summaries) > 100:
-            self.session_summaries = self.session_summaries[-50:]
-        if len(self.conversation_history) > 1000:
-            self.conversation_history = self.conversation_history[-500:]
+        keywords = self._extract_keywords(problem)
+        with self._lock:
+            # 会话摘要与关键词在同一把锁内追加，保证两个列表始终一一对应
+            self.session_summaries.append(session)
+            self._session_keywords.append(keywords)
+            self.conversation_history.extend(conversation)
+            
+            # 限制记忆大小
+            if len(self.session_summaries) > 100:
+                self.session_summaries = self.session_summaries[-50:]
+                self._session_keywords = self._session_keywords[-50:]
+            if len(self.conversation_history) > 1000:
+                self.conversation_history = self.conversation_history[-500:]
         
         self.save_memory()
     
+    def clear(self):
+        """清除全部记忆（会话摘要与关键词索引一起清空，保持一一对应）"""
+        with self._lock:
+            self.conversation_history = []
+            self.session_summaries = []
+            self._session_keywords = []
+        self.save_memory()
+    
     def get_relevant_context(self, problem: str, max_sessions: int = 3) -> str:
         """获取相关上下文"""
         if not self.session_summaries:
             return ""
         
         # 简单的关键词匹配（可以改进为语义搜索）
-        relevant_sessions = []
-        problem_keywords = set(problem.lower().split())
-        
-        for session in self.session_summaries:
-            session_keywords = set(session["problem"].lower().split())
-            overlap = len(problem_keywords & session_keywords)
-            if overlap > 0:
-                relevant_sessions.append((overlap, session))
+        problem_keywords = self._extract_keywords(problem)
+        if not problem_keywords:
+            # 问题中没有可匹配的关键词，所有会话得分都为0，无需扫描
+            return ""
         
-        # 按相关性排序
-        relevant_sessions.sort(key=lambda x: x[0], reverse=True)
+        # 在锁内取一致的快照，扫描期间其他线程的追加/裁剪不影响配对
+        with self._lock:
+            session_pairs = list(zip(self._session_keywords, self.session_summaries))
         
-        context = ""
-        for i, (score, session) in enumerate(relevant_sessions[:max_sessions]):
-            context += f"历史问题{i+1}: {session['problem']}\n解决方案: {session['solution']}\n\n"
+        # 打分、过滤与取前max_sessions个在同一遍扫描中完成
+        scored_sessions = (
+            (len(problem_keywords & session_keywords), session)
+            for session_keywords, session in session_pairs
+        )
+        top_sessions = heapq.nlargest(
+            max_sessions,
+            (item for item in scored_sessions if item[0] > 0),
+            key=lambda x: x[0]
+        )
         
-        return context
+        return "".join(
+            f"历史问题{i+1}: {session['problem']}\n解决方案: {session['solution']}\n\n"
+            for i, (score, session) in enumerate(top_sessions)
+        )
     
     def get_memory_summary(self) -> str:
         """获取记忆摘要"""
@@ -124,10 +204,12 @@ class MemoryManager:
         """
 
 class ProjectStateManager:
-    """项目状态管理器 - 文件持久化存储"""
+    """项目状态管理器 - 文件持久化存储（进程内共享，修改与快照均在锁内进行）"""
     
     def __init__(self, state_file: str = "project_states.pkl"):
         self.state_file = state_file
+        # 可重入锁：update_project_state 内部还会调用 get_project_state / save_states
+        self._lock = threading.RLock()
         self.project_states: Dict[str, Dict[str, Any]] = {}
         self.load_states()
     
@@ -143,33 +225,72 @@ class ProjectStateManager:
                 self.project_states = {}
     
     def save_states(self):
-        """保存项目状态"""
-        try:
-            with open(self.state_file, 'wb') as f:
-                pickle.dump(self.project_states, f)
-        except Exception as e:
-            print(f"❌ 保存项目状态失败: {e}")
+        """保存项目状态（提交到后台写线程）"""
+        # 复制每个项目状态的快照（连同其中的文件/文档列表），避免后台序列化时与后续修改冲突
+        with self._lock:
+            data = {
+                project_id: {
+                    key: list(value) if isinstance(value, list) else value
+                    for key, value in state.items()
+                }
+                for project_id, state in self.project_states.items()
+            }
+        _schedule_pickle_write(self.state_file, data, "❌ 保存项目状态失败")
     
     def get_project_state(self, project_id: str) -> Dict[str, Any]:
         """获取项目状态"""
-        if project_id not in self.project_states:
-            from datetime import datetime
-            self.project_states[project_id] = {
-                "pdf_files_parsed": [],
-                "documents_generated": [],
-                "created_time": datetime.now().isoformat(),
-                "last_activity": datetime.now().isoformat()
-            }
-        return self.project_states[project_id]
+        with self._lock:
+            if project_id not in self.project_states:
+                now = datetime.now().isoformat()
+                self.project_states[project_id] = {
+                    "pdf_files_parsed": [],
+                    "documents_generated": [],
+                    "created_time": now,
+                    "last_activity": now
+                }
+            return self.project_states[project_id]
     
     def update_project_state(self, project_id: str, **updates):
         """更新项目状态"""
-        from datetime import datetime
-        state = self.get_project_state(project_id)
-        state.update(updates)
-        state["last_activity"] = datetime.now().isoformat()
-        self.project_states[project_id] = state
-        self.save_states()
+        with self._lock:
+            state = self.get_project_state(project_id)
+            state.update(updates)
+            state["last_activity"] = datetime.now().isoformat()
+            self.project_states[project_id] = state
+            self.save_states()
+    
+    def append_to_project_list(self, project_id: str, key: str, item: Dict[str, Any], dedupe_key: Optional[str] = None) -> bool:
+        """
+        向项目状态中的列表追加一项（查重与追加在同一把锁内完成）
+        
+        Args:
+            project_id: 项目ID
+            key: 列表字段名，如 pdf_files_parsed / documents_generated
+            item: 要追加的条目
+            dedupe_key: 查重字段名；列表中已有该字段值相同的条目时不追加
+        
+        Returns:
+            bool: 是否追加成功
+        """
+        with self._lock:
+            state = self.get_project_state(project_id)
+            items = state.setdefault(key, [])
+            if dedupe_key is not None and any(existing.get(dedupe_key) == item.get(dedupe_key) for existing in items):
+                return False
+            items.append(item)
+            state["last_activity"] = datetime.now().isoformat()
+            self.save_states()
+            return True
+    
+    def remove_project_state(self, project_id: str) -> bool:
+        """删除项目状态，返回是否存在并已删除"""
+        with self._lock:
+            return self.project_states.pop(project_id, None) is not None
+    
+    def list_project_states(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """获取 (项目ID, 状态) 列表快照，遍历期间其他线程新增项目不会影响迭代"""
+        with self._lock:
+            return list(self.project_states.items())
     
     def get_project_context_for_prompt(self, project_id: str) -> str:
         """获取项目状态上下文，用于prompt"""
@@ -209,6 +330,16 @@ class ProjectStateManager:
         
         return context
 
+@functools.lru_cache(maxsize=None)
+def get_memory_manager(memory_file: str = "agent_memory.pkl") -> MemoryManager:
+    """获取进程内共享的记忆管理器（每个文件只加载一次）"""
+    return MemoryManager(memory_file)
+
+@functools.lru_cache(maxsize=None)
+def get_project_state_manager(state_file: str = "project_states.pkl") -> ProjectStateManager:
+    """获取进程内共享的项目状态管理器（每个文件只加载一次）"""
+    return ProjectStateManager(state_file)
+
 class EnhancedReActAgent:
     """增强版ReAct Agent"""
     
@@ -225,11 +356,11 @@ class EnhancedReActAgent:
         self.max_iterations = max_iterations
         self.verbose = verbose
         
-        # 记忆管理
-        self.memory_manager = MemoryManager() if enable_memory else None
+        # 记忆管理（进程内共享，避免每个请求重新反序列化pickle文件）
+        self.memory_manager = get_memory_manager() if enable_memory else None
         
         # 📁 项目状态管理器 - 文件持久化存储
-        self.project_state_manager = ProjectStateManager()
+        self.project_state_manager = get_project_state_manager()
         
         # 当前状态
         self.current_problem = None
@@ -248,8 +379,8 @@ class EnhancedReActAgent:
     def _build_system_prompt(self) -> str:
         """构建系统提示词"""
         try:
-            from prompts.loader import PromptLoader
-            prompt_loader = PromptLoader()
+            # 复用全局prompt加载器，YAML只在进程内解析一次，不随每个Agent实例重复读盘
+            prompt_loader = get_prompt_loader()
             project_context = getattr(self.tool_registry, 'project_context', None)
             
             # 传递agent实例给prompt loader以获取项目状态
@@ -268,7 +399,7 @@ class EnhancedReActAgent:
         """解析LLM响应 - 修复多轮生成问题"""
         
         # 🔧 关键修复：检测LLM是否一次性生成了多轮对话
-        observation_count = len(re.findall(r'Observation:', response))
+        observation_count = response.count('Observation:')
         if observation_count > 0:
             print(f"⚠️ 检测到LLM生成了假的Observation ({observation_count}个)，这是错误的行为！")
             print("🔧 将只解析第一轮的Thought和Action，忽略后续伪造内容")
@@ -301,14 +432,14 @@ class EnhancedReActAgent:
         
         # 标准解析逻辑
         # 查找 Thought
-        thought_match = re.search(r'Thought:\s*(.*?)(?=\n(?:Action|Final Answer)|\Z)', response, re.DOTALL)
+        thought_match = _THOUGHT_RE.search(response)
         thought = thought_match.group(1).strip() if thought_match else None
         
         # 查找 Final Answer - 但只在没有Action时才认为是最终答案
-        final_answer_match = re.search(r'Final Answer:\s*(.*)', response, re.DOTALL)
-        action_exists = re.search(r'Action:\s*(\w+)', response)
+        final_answer_match = _FINAL_ANSWER_RE.search(response)
+        action_match = _ACTION_RE.search(response)
         
-        if final_answer_match and not action_exists:
+        if final_answer_match and not action_match:
             # 真正的最终答案（没有伴随Action）
             final_answer_content = final_answer_match.group(1).strip()
             # 🔍 调试：显示解析的Final Answer长度
@@ -316,11 +447,10 @@ class EnhancedReActAgent:
             return thought, None, final_answer_content
         
         # 查找 Action（优先执行Action）
-        action_match = re.search(r'Action:\s*(\w+)', response)
         action = action_match.group(1) if action_match else None
         
         # 查找 Action Input
-        action_input_match = re.search(r'Action Input:\s*(.*?)(?=\n(?:Thought|Action|Final Answer|Observation)|\Z)', response, re.DOTALL)
+        action_input_match = _ACTION_INPUT_RE.search(response)
         action_input = action_input_match.group(1).strip() if action_input_match else None
         
         return thought, action, action_input
@@ -342,9 +472,9 @@ class EnhancedReActAgent:
         
         # 🔧 修复：添加retry_recommended逻辑
         retry_recommended = False
-        if error_type in ["timeout_error", "connection_error"]:
+        if error_type in _RETRYABLE_ERROR_TYPES:
             retry_recommended = True
-        elif error_type == "api_error" and http_status in [500, 502, 503, 504]:
+        elif error_type == "api_error" and http_status in _RETRYABLE_HTTP_STATUS:
             retry_recommended = True
         
         return {
@@ -387,7 +517,7 @@ class EnhancedReActAgent:
             "raw_result": error_analysis.get("raw_result", result)
         }
         
-        return json.dumps(formatted_error, ensure_ascii=False, indent=2)
+        return json_dumps(formatted_error, indent=True)
     
     async def execute_with_retry(self, action: str, action_input: str, max_retries: int = 2) -> str:
         """
@@ -402,31 +532,29 @@ class EnhancedReActAgent:
             工具执行结果
         """
         retry_count = 0
-        original_params = None
+        
+        # 解析参数（只在进入重试循环前解析一次，重试时直接使用修正后的参数字典）
+        if action_input.strip().startswith('{'):
+            try:
+                params = json_loads(action_input)
+            except json.JSONDecodeError:
+                return f"无法解析Action Input JSON格式: {action_input}"
+        else:
+            params = {"query": action_input}
         
         while retry_count <= max_retries:
             if retry_count > 0:
                 print(f"🔄 第 {retry_count} 次重试 {action}...")
             
-            # 解析参数
-            if action_input.strip().startswith('{'):
-                try:
-                    params = json.loads(action_input)
-                except json.JSONDecodeError:
-                    return f"无法解析Action Input JSON格式: {action_input}"
-            else:
-                params = {"query": action_input}
-            
-            if original_params is None:
-                original_params = params.copy()
-            
             # 执行工具
             result = await self.tool_registry.execute_tool(action, **params)
             
             # 🔧 增加详细的调试信息
             print(f"🔍 工具执行结果: action={action}")
             print(f"🔍 result类型: {type(result)}")
-            print(f"🔍 result内容: {json.dumps(result, ensure_ascii=False, indent=2) if isinstance(result, dict) else str(result)}")
+            # 结果只序列化一次，调试输出与成功返回共用
+            result_text = json_dumps(result, indent=True) if isinstance(result, dict) else str(result)
+            print(f"🔍 result内容: {result_text}")
             print(f"🔍 success字段: {result.get('success') if isinstance(result, dict) else 'N/A'}")
             
             # 🎯 改进成功判断逻辑
@@ -449,7 +577,7 @@ class EnhancedReActAgent:
                 if retry_count > 0:
                     print(f"✅ {action} 重试成功！")
                 print(f"✅ {action} 执行成功，返回结果")
-                return json.dumps(result, ensure_ascii=False, indent=2)
+                return result_text
             
             # 分析错误
             error_analysis = self.analyze_tool_error(action, result)
@@ -467,8 +595,8 @@ class EnhancedReActAgent:
                 corrected_params = error_analysis["corrected_params"]
                 print(f"🔧 自动修正参数: {corrected_params}")
                 
-                # 使用修正后的参数更新action_input
-                action_input = json.dumps(corrected_params, ensure_ascii=False)
+                # 使用修正后的参数进行下一次重试
+                params = corrected_params
                 retry_count += 1
                 continue
             
@@ -478,6 +606,58 @@ class EnhancedReActAgent:
         # 不应该到达这里
         return f"工具 {action} 执行失败，已达到最大重试次数"
     
+    def _process_agent_message(self, result: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        解析工具结果并检查agent_message
+        
+        Args:
+            result: 工具执行结果字符串
+            
+        Returns:
+            (结果字符串, 解析后的结果字典)；结果不是JSON对象时字典为None
+        """
+        if not isinstance(result, str):
+            return result, None
+        
+        # 纯文本结果（如错误信息）不可能是JSON对象，无需尝试解析
+        if not result.lstrip().startswith('{'):
+            return result, None
+        
+        try:
+            result_dict = json_loads(result)
+        except json.JSONDecodeError:
+            return result, None
+        
+        if not isinstance(result_dict, dict):
+            return result, None
+        
+        if result_dict.get("success") and result_dict.get("agent_message"):
+            agent_message = result_dict["agent_message"]
+            print(f"🎯 工具返回了agent_message，将在下一轮作为Final Answer: {len(agent_message)} 字符")
+            print(f"📝 agent_message内容: {agent_message[:200]}...")
+            
+            # 在结果中添加特殊标记，提示Agent应该使用这个消息作为Final Answer
+            result_dict["_should_use_agent_message"] = True
+            result = json_dumps(result_dict, indent=True)
+        
+        return result, result_dict
+    
+    @staticmethod
+    def _parse_action_params(action_input: str) -> Optional[Dict[str, Any]]:
+        """
+        解析Action Input中的JSON参数（仅供需要参数的工具结果处理使用）
+        
+        Returns:
+            参数字典；不是JSON格式时返回None（纯文本输入不做解析尝试）
+        """
+        if not action_input.lstrip().startswith('{'):
+            return None
+        try:
+            params = json_loads(action_input)
+        except json.JSONDecodeError:
+            return None
+        return params if isinstance(params, dict) else {}
+    
     async def _execute_action(self, action: str, action_input: str) -> str:
         """执行工具 - 增加智能重试机制"""
         try:
@@ -494,70 +674,50 @@ class EnhancedReActAgent:
                         "project_id": project_id,
                         "cached_state": self._get_project_state(project_id)
                     }
-                    return json.dumps(skip_result, ensure_ascii=False, indent=2)
+                    return json_dumps(skip_result, indent=True)
             
             # 🔄 使用智能重试执行工具
             result = await self.execute_with_retry(action, action_input, max_retries=2)
             
-            # 🎯 检查工具返回结果中是否包含agent_message（异步版本）
-            try:
-                import json
-                if isinstance(result, str):
-                    result_dict = json.loads(result)
-                    if result_dict.get("success") and result_dict.get("agent_message"):
-                        agent_message = result_dict["agent_message"]
-                        print(f"🎯 工具返回了agent_message，将在下一轮作为Final Answer: {len(agent_message)} 字符")
-                        print(f"📝 agent_message内容: {agent_message[:200]}...")
-                        
-                        # 在结果中添加特殊标记，提示Agent应该使用这个消息作为Final Answer
-                        result_dict["_should_use_agent_message"] = True
-                        result = json.dumps(result_dict, ensure_ascii=False, indent=2)
-            except Exception as e:
-                print(f"⚠️ 处理agent_message时出错: {e}")
+            # 🎯 检查工具返回结果中是否包含agent_message（异步版本），结果只解析一次
+            result, result_dict = self._process_agent_message(result)
             
-            # 🧠 短期记忆更新 - 处理PDF解析结果
-            if project_id and action == "pdf_parser":
-                try:
-                    result_data = json.loads(result)
-                    if result_data.get("success", False):
-                        # 尝试从参数中提取文件名
-                        filename = None
-                        try:
-                            params = json.loads(action_input)
-                            if 'minio_url' in params:
-                                # 从minio://bucket/file.pdf中提取文件名
-                                minio_url = params['minio_url']
-                                filename = minio_url.split('/')[-1] if '/' in minio_url else minio_url
-                                # 移除minio://前缀如果存在
-                                if filename.startswith('minio://'):
-                                    filename = filename[8:].split('/')[-1]
-                        except (json.JSONDecodeError, KeyError):
-                            filename = "unknown_file"
-                        
-                        self._handle_pdf_parse_result(project_id, result_data, filename)
-                except json.JSONDecodeError:
-                    pass  # 如果不是JSON格式，忽略
-            
-            # 🧠 短期记忆更新 - 处理文档生成结果
-            if project_id and action == "document_generator":
-                try:
-                    result_data = json.loads(result)
-                    if result_data.get("success", False):
-                        # 尝试从参数中提取文档信息
-                        title = params.get('title')
-                        doc_type = params.get('action') or params.get('type')
-                        
-                        self._handle_document_generation_result(project_id, result_data, title, doc_type)
-                except json.JSONDecodeError:
-                    pass
+            # 🧠 短期记忆更新 - 处理PDF解析和文档生成结果
+            if project_id and result_dict and result_dict.get("success", False):
+                if action == "pdf_parser":
+                    params = self._parse_action_params(action_input)
+                    filename = None if params is not None else "unknown_file"
+                    params = params or {}
+                    # 尝试从参数中提取文件名
+                    if 'minio_url' in params:
+                        # 从minio://bucket/file.pdf中提取文件名
+                        minio_url = params['minio_url']
+                        filename = minio_url.split('/')[-1] if '/' in minio_url else minio_url
+                        # 移除minio://前缀如果存在
+                        if filename.startswith('minio://'):
+                            filename = filename[8:].split('/')[-1]
+                    
+                    self._handle_pdf_parse_result(project_id, result_dict, filename)
+                
+                elif action == "document_generator":
+                    # 尝试从参数中提取文档信息
+                    params = self._parse_action_params(action_input) or {}
+                    title = params.get('title')
+                    doc_type = params.get('action') or params.get('type')
+                    
+                    self._handle_document_generation_result(project_id, result_dict, title, doc_type)
                 
             return result
                 
         except Exception as e:
             return f"执行工具 '{action}' 时发生错误: {str(e)}"
     
-    def _execute_action_sync(self, action: str, action_input: str) -> str:
-        """执行工具 - 同步版本，支持智能重试"""
+    def _execute_action_sync(self, action: str, action_input: str, loop: Optional[asyncio.AbstractEventLoop] = None) -> str:
+        """
+        执行工具 - 同步版本，支持智能重试
+        
+        传入loop时在该事件循环上执行并复用其工具API会话（由调用方关闭），否则使用临时事件循环
+        """
         try:
             # 🧠 短期记忆检查 - 在工具执行前检查是否需要跳过
             project_id = self._get_current_project_id()
@@ -572,35 +732,30 @@ class EnhancedReActAgent:
                         "project_id": project_id,
                         "cached_state": self._get_project_state(project_id)
                     }
-                    return json.dumps(skip_result, ensure_ascii=False, indent=2)
+                    return json_dumps(skip_result, indent=True)
             
             # 🔄 使用异步重试机制的同步版本
-            import asyncio
             try:
-                # 在新的事件循环中执行异步重试
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                result = loop.run_until_complete(self.execute_with_retry(action, action_input, max_retries=2))
-                loop.close()
+                own_loop = loop is None
+                if own_loop:
+                    # 在新的事件循环中执行异步重试
+                    loop = asyncio.new_event_loop()
+                    asyncio.set_event_loop(loop)
+                try:
+                    result = loop.run_until_complete(self.execute_with_retry(action, action_input, max_retries=2))
+                finally:
+                    if own_loop:
+                        # 临时事件循环关闭前释放其上的工具API会话（释放失败也要关闭事件循环）
+                        try:
+                            loop.run_until_complete(close_api_session())
+                        finally:
+                            loop.close()
             except Exception as e:
                 return f"工具执行失败: {str(e)}"
             
             # 🎯 检查工具返回结果中是否包含agent_message
             # 如果包含，说明这是一个需要立即返回给用户的消息（如文档生成任务提交）
-            try:
-                import json
-                if isinstance(result, str):
-                    result_dict = json.loads(result)
-                    if result_dict.get("success") and result_dict.get("agent_message"):
-                        agent_message = result_dict["agent_message"]
-                        print(f"🎯 工具返回了agent_message，将在下一轮作为Final Answer: {len(agent_message)} 字符")
-                        print(f"📝 agent_message内容: {agent_message[:200]}...")
-                        
-                        # 在结果中添加特殊标记，提示Agent应该使用这个消息作为Final Answer
-                        result_dict["_should_use_agent_message"] = True
-                        result = json.dumps(result_dict, ensure_ascii=False, indent=2)
-            except Exception as e:
-                print(f"⚠️ 处理agent_message时出错: {e}")
+            result, _ = self._process_agent_message(result)
             
             return result
                 
@@ -647,24 +802,23 @@ class EnhancedReActAgent:
     
 # solve_problem_stream方法已移除，现在使用ThoughtInterceptor实现真正的实时流式输出
     
-    def _react_loop(self, problem: str) -> str:
-        """ReAct循环逻辑 - 处理所有类型的请求"""
-        if self.verbose:
-            print(f"{Fore.CYAN}{'='*50}")
-            print(f"{Fore.CYAN}ReAct Agent 开始解决问题")
-            print(f"{Fore.CYAN}问题: {problem}")
-            print(f"{Fore.CYAN}{'='*50}")
-        
-        # 构建对话历史
-        conversation = []
-        conversation.append({"role": "system", "content": self.system_prompt})
+    def _build_initial_conversation(self, problem: str) -> List[Dict[str, str]]:
+        """构建ReAct循环的初始对话：系统提示词 + 相关历史经验 + 用户问题"""
+        conversation = [{"role": "system", "content": self.system_prompt}]
+        try:
+            prompt_loader = get_prompt_loader()
+        except Exception as e:
+            # prompt加载器创建失败（如YAML缺失或格式错误）时，下面的模板统一回退到默认格式
+            print(f"⚠️ 加载prompt模板失败，使用默认格式: {e}")
+            prompt_loader = None
         
         # 添加历史上下文（如果启用记忆）
         if self.memory_manager:
             context = self.memory_manager.get_relevant_context(problem)
             if context:
                 try:
-                    prompt_loader = get_prompt_loader()
+                    if prompt_loader is None:
+                        raise RuntimeError("prompt加载器不可用")
                     memory_template = prompt_loader.get_prompt("system", "memory_context_template")
                     memory_content = memory_template.format(context=context)
                 except Exception as e:
@@ -677,7 +831,8 @@ class EnhancedReActAgent:
         
         # 添加用户问题
         try:
-            prompt_loader = get_prompt_loader()
+            if prompt_loader is None:
+                raise RuntimeError("prompt加载器不可用")
             question_template = prompt_loader.get_prompt("system", "user_question_template")
             user_question = question_template.format(problem=problem)
         except Exception as e:
@@ -685,13 +840,56 @@ class EnhancedReActAgent:
             user_question = f"问题: {problem}"
         
         conversation.append({"role": "user", "content": user_question})
+        return conversation
+    
+    def _print_thought(self, thought: Optional[str], response: str):
+        """输出思考内容；未解析到标准Thought时显示响应中第一行有效内容"""
+        if thought:
+            print(f"Thought: {thought}")
+            return
+        
+        for line in response.strip().split('\n'):
+            line = line.strip()
+            if line and not line.startswith('```'):
+                print(f"Thought: {line}")
+                return
+        
+        print(f"Thought: [未解析到标准格式] {response[:100]}...")
+    
+    def _react_loop(self, problem: str) -> str:
+        """ReAct循环逻辑 - 处理所有类型的请求"""
+        # 整个循环复用同一个事件循环，LLM与工具API的keep-alive连接在各轮之间保持
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            return self._run_react_loop(problem, loop)
+        finally:
+            # 关闭事件循环前释放其上的LLM会话与工具API会话；每一步失败都不影响后续清理
+            try:
+                loop.run_until_complete(self.client.close())
+            finally:
+                try:
+                    loop.run_until_complete(close_api_session())
+                finally:
+                    loop.close()
+    
+    def _run_react_loop(self, problem: str, loop: asyncio.AbstractEventLoop) -> str:
+        """同步ReAct循环的主体，所有LLM与工具调用都在传入的事件循环上执行"""
+        if self.verbose:
+            print(f"{Fore.CYAN}{'='*50}")
+            print(f"{Fore.CYAN}ReAct Agent 开始解决问题")
+            print(f"{Fore.CYAN}问题: {problem}")
+            print(f"{Fore.CYAN}{'='*50}")
+        
+        # 构建对话历史
+        conversation = self._build_initial_conversation(problem)
         
         for iteration in range(self.max_iterations):
             # 直接 print，会被 ThoughtLogger 拦截
             print(f"\n--- 第 {iteration + 1} 轮 ---")
             
             # 获取LLM响应
-            result = self.client.chat_completion_sync(conversation)
+            result = self.client.chat_completion_sync(conversation, loop=loop)
             response = result["choices"][0]["message"]["content"]
             usage_info = result.get("usage", {})
             conversation.append({"role": "assistant", "content": response})
@@ -707,20 +905,7 @@ class EnhancedReActAgent:
             print(f"🔍 解析结果: thought={thought is not None}, action={action}, action_input={action_input_or_final is not None}")
             
             # 🔧 修复：强制显示思考内容，即使解析失败
-            if thought:
-                print(f"Thought: {thought}")
-            else:
-                # 如果没有解析到标准的Thought，尝试显示响应的第一部分
-                lines = response.strip().split('\n')
-                first_meaningful_line = ""
-                for line in lines:
-                    if line.strip() and not line.strip().startswith('```'):
-                        first_meaningful_line = line.strip()
-                        break
-                if first_meaningful_line:
-                    print(f"Thought: {first_meaningful_line}")
-                else:
-                    print(f"Thought: [未解析到标准格式] {response[:100]}...")
+            self._print_thought(thought, response)
             
             # 检查是否是最终答案
             if action is None and action_input_or_final:
@@ -741,14 +926,13 @@ class EnhancedReActAgent:
                     print(f"Action Input: {action_input_or_final}")
                 
                 # 执行工具 - 同步版本
-                observation = self._execute_action_sync(action, action_input_or_final or "")
+                observation = self._execute_action_sync(action, action_input_or_final or "", loop=loop)
                 print(f"Observation: {observation}")
                 
                 # 🎯 检查工具响应是否包含应该立即使用的agent_message
                 try:
-                    import json
-                    if isinstance(observation, str) and observation.strip().startswith('{'):
-                        observation_dict = json.loads(observation)
+                    if isinstance(observation, str) and _AGENT_MESSAGE_MARKER in observation:
+                        observation_dict = json_loads(observation)
                         if observation_dict.get("_should_use_agent_message") and observation_dict.get("agent_message"):
                             agent_message = observation_dict["agent_message"]
                             print(f"🎯 检测到agent_message，立即作为Final Answer返回")
@@ -789,33 +973,7 @@ class EnhancedReActAgent:
             print(f"{Fore.CYAN}{'='*50}")
         
         # 构建对话历史
-        conversation = []
-        conversation.append({"role": "system", "content": self.system_prompt})
-        
-        # 添加历史上下文（如果启用记忆）
-        if self.memory_manager:
-            context = self.memory_manager.get_relevant_context(problem)
-            if context:
-                try:
-                    prompt_loader = get_prompt_loader()
-                    memory_template = prompt_loader.get_prompt("system", "memory_context_template")
-                    memory_content = memory_template.format(context=context)
-                except Exception as e:
-                    memory_content = f"相关历史经验:\n{context}"
-                
-                conversation.append({"role": "system", "content": memory_content})
-                if self.verbose:
-                    print(f"{Fore.YELLOW}📚 找到相关历史经验")
-        
-        # 添加用户问题
-        try:
-            prompt_loader = get_prompt_loader()
-            question_template = prompt_loader.get_prompt("system", "user_question_template")
-            user_question = question_template.format(problem=problem)
-        except Exception as e:
-            user_question = f"问题: {problem}"
-        
-        conversation.append({"role": "user", "content": user_question})
+        conversation = self._build_initial_conversation(problem)
         
         for iteration in range(self.max_iterations):
             # 直接 print，会被 ThoughtLogger 拦截
@@ -846,20 +1004,7 @@ class EnhancedReActAgent:
             }
             
             # 🔧 修复：强制显示思考内容，即使解析失败
-            if thought:
-                print(f"Thought: {thought}")
-            else:
-                # 如果没有解析到标准的Thought，尝试显示响应的第一部分
-                lines = response.strip().split('\n')
-                first_meaningful_line = ""
-                for line in lines:
-                    if line.strip() and not line.strip().startswith('```'):
-                        first_meaningful_line = line.strip()
-                        break
-                if first_meaningful_line:
-                    print(f"Thought: {first_meaningful_line}")
-                else:
-                    print(f"Thought: [未解析到标准格式] {response[:100]}...")
+            self._print_thought(thought, response)
             
             # 检查是否是最终答案
             if action is None and action_input_or_final:
@@ -893,9 +1038,8 @@ class EnhancedReActAgent:
                 
                 # 🎯 检查工具响应是否包含应该立即使用的agent_message
                 try:
-                    import json
-                    if isinstance(observation, str) and observation.strip().startswith('{'):
-                        observation_dict = json.loads(observation)
+                    if isinstance(observation, str) and _AGENT_MESSAGE_MARKER in observation:
+                        observation_dict = json_loads(observation)
                         if observation_dict.get("_should_use_agent_message") and observation_dict.get("agent_message"):
                             agent_message = observation_dict["agent_message"]
                             print(f"🎯 检测到agent_message，立即作为Final Answer返回")
@@ -1001,9 +1145,7 @@ class EnhancedReActAgent:
     def clear_memory(self):
         """清除记忆"""
         if self.memory_manager:
-            self.memory_manager.conversation_history.clear()
-            self.memory_manager.session_summaries.clear()
-            self.memory_manager.save_memory()
+            self.memory_manager.clear()
             print("记忆已清除") 
 
     def _get_current_project_id(self) -> Optional[str]:
@@ -1053,15 +1195,15 @@ class EnhancedReActAgent:
     def _handle_pdf_parse_result(self, project_id: str, result: Dict[str, Any], filename: str = None):
         """处理PDF解析结果，更新短期记忆"""
         if result.get("success", False):
-            from datetime import datetime
-            project_state = self._get_project_state(project_id)
+            # 项目知识库已更新，清除AI编辑器中该项目的RAG结果缓存
+            from routers.ai_editor import invalidate_rag_cache
+            invalidate_rag_cache(self._get_current_project_name())
             
             # 提取文件名（从结果或参数中获取）
             if not filename:
                 filename = result.get("filename") or result.get("file_name") or "unknown.pdf"
             
             # 添加到已解析文件列表
-            from datetime import datetime
             parsed_file = {
                 "name": filename,
                 "status": "success",
@@ -1069,12 +1211,8 @@ class EnhancedReActAgent:
                 "message": result.get("message", "PDF解析成功")
             }
             
-            # 避免重复添加
-            pdf_files_parsed = project_state.get("pdf_files_parsed", [])
-            if not any(f.get("name") == filename for f in pdf_files_parsed):
-                pdf_files_parsed.append(parsed_file)
-                self._update_project_state(project_id, pdf_files_parsed=pdf_files_parsed)
-                
+            # 避免重复添加（查重与追加由状态管理器在锁内完成）
+            if self.project_state_manager.append_to_project_list(project_id, "pdf_files_parsed", parsed_file, dedupe_key="name"):
                 if self.verbose:
                     print(f"📄 PDF解析完成 - 项目 {project_id}, 文件: {filename}")
             else:
@@ -1084,9 +1222,6 @@ class EnhancedReActAgent:
     def _handle_document_generation_result(self, project_id: str, result: Dict[str, Any], title: str = None, doc_type: str = None):
         """处理文档生成结果，更新短期记忆"""
         if result.get("success", False):
-            from datetime import datetime
-            project_state = self._get_project_state(project_id)
-            
             # 提取文档信息
             if not title:
                 title = result.get("title") or result.get("document_title") or "未命名文档"
@@ -1094,7 +1229,6 @@ class EnhancedReActAgent:
                 doc_type = result.get("type") or result.get("document_type") or "unknown"
             
             # 添加到生成文档列表
-            from datetime import datetime
             generated_doc = {
                 "title": title,
                 "type": doc_type,
@@ -1103,20 +1237,19 @@ class EnhancedReActAgent:
                 "file_path": result.get("file_path") or result.get("output_file")
             }
             
-            documents_generated = project_state.get("documents_generated", [])
-            documents_generated.append(generated_doc)
-            self._update_project_state(project_id, documents_generated=documents_generated)
+            self.project_state_manager.append_to_project_list(project_id, "documents_generated", generated_doc)
             
             if self.verbose:
                 print(f"📄 文档生成完成 - 项目 {project_id}, 标题: {title}, 类型: {doc_type}")
 
     def get_short_term_memory_summary(self) -> str:
         """获取短期记忆摘要"""
-        if not self.project_state_manager.project_states:
+        project_states = self.project_state_manager.list_project_states()
+        if not project_states:
             return "📁 短期记忆: 暂无项目状态记录"
         
         summary = "📁 短期记忆状态:\n"
-        for project_id, state in self.project_state_manager.project_states.items():
+        for project_id, state in project_states:
             pdf_files = state.get("pdf_files_parsed", [])
             documents = state.get("documents_generated", [])
             
@@ -1166,8 +1299,7 @@ class EnhancedReActAgent:
 
     def clear_project_memory(self, project_id: str):
         """清除指定项目的短期记忆"""
-        if project_id in self.project_state_manager.project_states:
-            del self.project_state_manager.project_states[project_id]
+        if self.project_state_manager.remove_project_state(project_id):
             if self.verbose:
                 print(f"📁 已清除项目 {project_id} 的短期记忆")
     
@@ -1265,14 +1397,17 @@ class EnhancedReActAgent:
         Returns:
             bool: 是否有PDF被解析
         """
-        import asyncio
-        
         try:
             # 在新的事件循环中执行异步解析
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(self.auto_parse_pdfs(files))
-            loop.close()
+            try:
+                result = loop.run_until_complete(self.auto_parse_pdfs(files))
+            finally:
+                try:
+                    loop.run_until_complete(close_api_session())
+                finally:
+                    loop.close()
             return result
         except Exception as e:
             if self.verbose:
@@ -0,0 +1,60 @@
+"""
+JSON序列化工具
+优先使用orjson（C实现，直接输出UTF-8），未安装时回退到标准库json
+
+与标准库的差异（仅在安装了orjson时存在）：
+- json_loads: 超出64位范围的整数会被解析为float，丧失精度（标准库保留为精确int）；
+  orjson拒绝的输入（NaN/Infinity、孤立的代理对转义如 \\ud800 等）会交由标准库再解析，结果与标准库一致
+- json_dumps: NaN/Infinity 输出为 null（标准库输出 NaN/Infinity）；
+  超出64位范围的整数、非字符串键等orjson不支持的类型回退到标准库处理
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_dumps(obj: Any, indent: bool = False) -> str:
+    """
+    序列化为JSON字符串，保留中文原文（等价于 ensure_ascii=False）
+
+    Args:
+        obj: 待序列化对象
+        indent: 是否使用2空格缩进
+
+    Returns:
+        str: JSON字符串
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+        except TypeError:
+            # orjson不支持的类型（如非字符串键、超大整数）回退到标准库处理
+            pass
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None)
+
+
+def json_loads(data: Any) -> Any:
+    """
+    反序列化JSON字符串或字节
+
+    解析失败时抛出 json.JSONDecodeError
+
+    Args:
+        data: JSON字符串或字节
+
+    Returns:
+        Any: 解析结果
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson比标准库严格（如NaN、孤立代理对），交由标准库再判定一次；
+            # 明显不是JSON的纯文本应由调用方先行过滤，避免被解析两遍
+            pass
+    return json.loads(data)
@@ -6,8 +6,12 @@ FastAPI主服务
 import os
 import urllib.parse
 import asyncio
+import functools
 import uuid
-import json
+import time
+import logging
+import tempfile
+import concurrent.futures
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from fastapi import FastAPI, Request, HTTPException
@@ -27,15 +31,16 @@ except ImportError:
 # 导入核心组件
 from deepseek_client import DeepSeekClient
 from enhanced_react_agent import EnhancedReActAgent
-from tools import create_core_tool_registry
+from tools import create_core_tool_registry, close_api_session
 from minio_client import upload_pdf_to_minio, get_minio_uploader
 from thought_logger import get_thought_data, clear_thought_queue, setup_thought_logger, restore_stdout
+from json_utils import json_dumps
 
 # 🆕 导入数据库组件
 from database import get_db, Project, ChatSession, ChatMessage, ProjectFile
-from database.database import get_accounts_db, SessionLocalAccounts
+from database.database import get_accounts_db, SessionLocalAccounts, engine, accounts_engine
 from database.crud import (
-    create_project, get_project, get_all_projects, get_project_summary, update_project_stats,
+    create_project, get_project, get_all_projects, get_projects_for_user, get_project_summary, update_project_stats,
     delete_project, get_current_session, create_new_session, save_message, get_session_messages,
     get_recent_messages, save_file_record, get_project_files, update_file_minio_path, get_project_by_name,
     create_user, get_user_by_username, add_project_member, get_project_member, list_project_members,
@@ -47,6 +52,7 @@ from sqlalchemy.orm import Session
 
 # 🆕 导入路由模块
 from routers import ai_editor, upload_with_version
+from routers.ai_editor import invalidate_rag_cache
 # === 简易鉴权（JWT）与项目成员检查 ===
 # 兼容环境中存在错误的 jwt 包（非 PyJWT）时的回退方案
 try:
@@ -58,6 +64,8 @@ except Exception:
 
 from passlib.hash import bcrypt
 
+logger = logging.getLogger(__name__)
+
 JWT_SECRET = os.getenv("JWT_SECRET", "dev_secret_change_me")
 JWT_ALG = "HS256"
 
@@ -193,6 +201,14 @@ class SessionMessagesResponse(BaseModel):
     total: int = 0
     page: int = 1
 
+# SSE流式响应的公共响应头（Starlette构造响应时会复制，可安全共享）
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "*"
+}
+
 # 初始化FastAPI应用
 app = FastAPI(
     title="ReactAgent API Server",
@@ -251,7 +267,6 @@ start_time = None
 async def startup_event():
     """应用启动时初始化"""
     global deepseek_client, tool_registry, start_time
-    import time
     start_time = time.time()
     
     print("🚀 ReactAgent API服务启动中...")
@@ -313,6 +328,18 @@ async def startup_event():
 
     print("🎉 ReactAgent API服务启动完成！")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时释放资源"""
+    if deepseek_client:
+        await deepseek_client.close()
+    await close_api_session()
+    await ai_editor.close_clients()
+    # 一次性关闭连接池中的全部空闲连接，避免进程退出时逐个等待socket回收
+    engine.dispose()
+    accounts_engine.dispose()
+    print("👋 ReactAgent API服务已关闭")
+
 @app.post("/auth/login", response_model=LoginResponse)
 async def auth_login(body: LoginRequest, db: Session = Depends(get_accounts_db)):
     user = get_user_by_username(db, body.username)
@@ -509,12 +536,14 @@ async def react_solve(request: Request, db: Session = Depends(get_db)):
                     # 获取或创建当前会话
                     if project_name:
                         print(f"💾 使用项目名称保存消息: {project_name}")
-                        current_session = get_current_session(db, project_name=project_name)
-                        if not current_session:
-                            current_session = create_new_session(db, project_name=project_name)
-                        # 获取实际的project_id用于保存
+                        # 按名称只解析一次项目，后续会话查询/创建都按project_id进行
                         actual_project = get_project_by_name(db, project_name)
-                        actual_project_id = actual_project.id if actual_project else project_id
+                        if not actual_project:
+                            raise ValueError(f"项目不存在: {project_name}")
+                        actual_project_id = actual_project.id
+                        current_session = get_current_session(db, project_id=actual_project_id)
+                        if not current_session:
+                            current_session = create_new_session(db, project_id=actual_project_id)
                     else:
                         current_session = get_current_session(db, project_id=project_id)
                         if not current_session:
@@ -528,7 +557,8 @@ async def react_solve(request: Request, db: Session = Depends(get_db)):
                         session_id=current_session.id,
                         role="user",
                         content=problem,
-                        extra_data={"files": files, "project_context": project_context, "project_name": project_name}
+                        extra_data={"files": files, "project_context": project_context, "project_name": project_name},
+                        update_stats=False  # 紧接着保存AI回复时统一刷新项目统计
                     )
                     
                     # 保存AI回复
@@ -611,7 +641,6 @@ async def upload_file(request: Request, file: UploadFile = File(...), db: Sessio
             raise HTTPException(status_code=400, detail="只支持PDF文件上传")
         
         # 创建临时本地文件
-        import tempfile
         with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
             # 分块写入，避免一次性读入内存
             chunk_size = 1024 * 1024  # 1MB
@@ -627,11 +656,16 @@ async def upload_file(request: Request, file: UploadFile = File(...), db: Sessio
         uploaded_size = os.path.getsize(temp_file_path)
         
         # 🚀 上传到MinIO (增强版验证)
-        minio_path, upload_error = upload_pdf_to_minio(
-            file_path=temp_file_path,
-            original_filename=file.filename,
-            project_id=effective_project_id,
-            verify_checksum=True  # 启用校验和验证以确保完整性
+        # MinIO客户端是同步阻塞的（读文件、计算MD5、上传、校验），放到线程池执行，避免阻塞事件循环
+        minio_path, upload_error = await asyncio.get_running_loop().run_in_executor(
+            None,
+            functools.partial(
+                upload_pdf_to_minio,
+                file_path=temp_file_path,
+                original_filename=file.filename,
+                project_id=effective_project_id,
+                verify_checksum=True  # 启用校验和验证以确保完整性
+            )
         )
         
         if not minio_path:
@@ -642,6 +676,9 @@ async def upload_file(request: Request, file: UploadFile = File(...), db: Sessio
             raise HTTPException(status_code=500, detail=error_detail)
         
         print(f"✅ MinIO上传并验证成功: {minio_path}")
+        # 项目文档已更新，清除AI编辑器中该项目的RAG结果缓存（未知项目名时全部清除）
+        invalidate_rag_cache(project_name)
+        uploaded_at = datetime.now().isoformat()
         
         # 🆕 保存文件记录到数据库 - 支持project_name
         file_record = None
@@ -688,7 +725,7 @@ async def upload_file(request: Request, file: UploadFile = File(...), db: Sessio
                         "project_name": project_name,
                         "project_id": actual_project_id,
                         "frontend_source": "web",
-                        "upload_timestamp": datetime.now().isoformat()
+                        "upload_timestamp": uploaded_at
                     }
                 }
                 
@@ -702,10 +739,7 @@ async def upload_file(request: Request, file: UploadFile = File(...), db: Sessio
                 
             except Exception as save_error:
                 print(f"⚠️ 保存文件记录到数据库失败: {save_error}")
-                print(f"⚠️ 错误详情: {type(save_error).__name__}: {str(save_error)}")
-                import traceback
-                print(f"⚠️ 完整错误堆栈:")
-                traceback.print_exc()
+                logger.exception("保存文件记录到数据库失败")
                 
                 # 尝试回滚数据库事务
                 try:
@@ -741,7 +775,7 @@ async def upload_file(request: Request, file: UploadFile = File(...), db: Sessio
                 "size_verified": True,
                 "existence_verified": True,
                 "checksum_verified": True,
-                "verification_timestamp": datetime.now().isoformat()
+                "verification_timestamp": uploaded_at
             }
         }
         
@@ -764,7 +798,6 @@ async def upload_file(request: Request, file: UploadFile = File(...), db: Sessio
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """健康检查"""
-    import time
     uptime = time.time() - start_time if start_time else 0
     
     return HealthResponse(
@@ -908,7 +941,7 @@ async def stream_live_thoughts():
                 "type": "start",
                 "message": "开始监听实时思考..."
             }
-            yield f"data: {json.dumps(start_data, ensure_ascii=False)}\n\n"
+            yield f"data: {json_dumps(start_data)}\n\n"
             
             # 持续监听thought数据
             data_count = 0
@@ -922,7 +955,7 @@ async def stream_live_thoughts():
                     data_count += 1
                     timeout_count = 0  # 重置超时计数
                     print(f"📤 实时发送thought数据 {data_count}: {thought_data['type']}")
-                    yield f"data: {json.dumps(thought_data, ensure_ascii=False)}\n\n"
+                    yield f"data: {json_dumps(thought_data)}\n\n"
                 else:
                     timeout_count += 1
                     # 发送心跳信号
@@ -931,7 +964,7 @@ async def stream_live_thoughts():
                             "type": "heartbeat",
                             "message": f"等待数据中... ({timeout_count}s)"
                         }
-                        yield f"data: {json.dumps(heartbeat, ensure_ascii=False)}\n\n"
+                        yield f"data: {json_dumps(heartbeat)}\n\n"
                 
                 await asyncio.sleep(0.02)  # 20ms检查间隔
             
@@ -940,7 +973,7 @@ async def stream_live_thoughts():
                 "type": "end",
                 "message": f"监听结束，共发送 {data_count} 条数据"
             }
-            yield f"data: {json.dumps(end_data, ensure_ascii=False)}\n\n"
+            yield f"data: {json_dumps(end_data)}\n\n"
             
         except Exception as e:
             print(f"❌ 实时thought监听异常: {e}")
@@ -948,17 +981,12 @@ async def stream_live_thoughts():
                 "type": "error",
                 "message": f"监听过程发生错误: {str(e)}"
             }
-            yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
+            yield f"data: {json_dumps(error_data)}\n\n"
     
     return StreamingResponse(
         thought_stream(),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "*"
-        }
+        headers=SSE_HEADERS
     )
 
 @app.get("/stream/thoughts/{session_id}")
@@ -968,24 +996,18 @@ async def stream_thoughts(session_id: str):
         # 检查会话是否存在
         if session_id not in active_sessions:
             # 返回会话已结束的信号，而不是404错误
-            import time
             async def session_ended_stream():
                 end_data = {
                     "type": "session_ended",
                     "message": "会话已结束或已过期",
                     "timestamp": time.time()
                 }
-                yield f"data: {json.dumps(end_data, ensure_ascii=False)}\n\n"
+                yield f"data: {json_dumps(end_data)}\n\n"
             
             return StreamingResponse(
                 session_ended_stream(),
                 media_type="text/event-stream",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "Connection": "keep-alive",
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "*"
-                }
+                headers=SSE_HEADERS
             )
         
         session_data = active_sessions[session_id]
@@ -1003,12 +1025,7 @@ async def stream_thoughts(session_id: str):
             return StreamingResponse(
                 error_stream(),
                 media_type="text/event-stream",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "Connection": "keep-alive",
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "*"
-                }
+                headers=SSE_HEADERS
             )
         
         # 🆕 创建带项目上下文的Agent实例
@@ -1042,10 +1059,6 @@ async def stream_thoughts(session_id: str):
                 print(f"🌊 Agent开始处理问题: {problem[:100]}...")
                 
                 # 使用线程池执行同步的Agent方法
-                import asyncio
-                import concurrent.futures
-                import time  # 确保time在正确位置导入
-                
         # 使用线程池执行Agent，避免阻塞主事件循环
                 with concurrent.futures.ThreadPoolExecutor() as executor:
                     future = executor.submit(agent._react_loop, full_problem)
@@ -1057,7 +1070,7 @@ async def stream_thoughts(session_id: str):
                         if thought_data:
                             data_sent_count += 1
                             print(f"📤 实时发送数据 {data_sent_count}: {thought_data['type']}")
-                            yield f"data: {json.dumps(thought_data, ensure_ascii=False)}\n\n"
+                            yield f"data: {json_dumps(thought_data)}\n\n"
                         
                         # 短暂休眠避免CPU占用过高
                         await asyncio.sleep(0.02)  # 减少延迟，提高响应性
@@ -1074,7 +1087,7 @@ async def stream_thoughts(session_id: str):
                     if thought_data:
                         remaining_count += 1
                         print(f"📤 发送剩余数据 {remaining_count}: {thought_data['type']}")
-                        yield f"data: {json.dumps(thought_data, ensure_ascii=False)}\n\n"
+                        yield f"data: {json_dumps(thought_data)}\n\n"
                     else:
                         break
                     await asyncio.sleep(0.02)
@@ -1092,7 +1105,7 @@ async def stream_thoughts(session_id: str):
                             "content": final_result,
                             "timestamp": time.time()
                         }
-                        yield f"data: {json.dumps(final_data, ensure_ascii=False)}\n\n"
+                        yield f"data: {json_dumps(final_data)}\n\n"
                         
                         # 🆕 保存AI回复到数据库
                         try:
@@ -1110,10 +1123,10 @@ async def stream_thoughts(session_id: str):
                                 try:
                                     # 获取当前会话
                                     if project_name:
-                                        current_session = get_current_session(db, project_name=project_name)
-                                        # 获取实际的project_id
+                                        # 按名称只解析一次项目，再按project_id取当前会话
                                         actual_project = get_project_by_name(db, project_name)
                                         actual_project_id = actual_project.id if actual_project else project_id
+                                        current_session = get_current_session(db, project_id=actual_project.id) if actual_project else None
                                     else:
                                         current_session = get_current_session(db, project_id=project_id)
                                         actual_project_id = project_id
@@ -1140,8 +1153,7 @@ async def stream_thoughts(session_id: str):
                                         
                                 except Exception as db_save_error:
                                     print(f"⚠️ 保存AI回复到数据库失败: {db_save_error}")
-                                    import traceback
-                                    traceback.print_exc()
+                                    logger.exception("保存AI回复到数据库失败")
                                 finally:
                                     db.close()
                             else:
@@ -1156,7 +1168,7 @@ async def stream_thoughts(session_id: str):
                             "content": "AI未能生成有效回复",
                             "timestamp": time.time()
                         }
-                        yield f"data: {json.dumps(empty_result_data, ensure_ascii=False)}\n\n"
+                        yield f"data: {json_dumps(empty_result_data)}\n\n"
                 
                 # 🔚 发送流结束信号
                 end_stream_data = {
@@ -1164,7 +1176,7 @@ async def stream_thoughts(session_id: str):
                     "message": f"对话完成，共处理 {data_sent_count} 条思考数据",
                     "timestamp": time.time()
                 }
-                yield f"data: {json.dumps(end_stream_data, ensure_ascii=False)}\n\n"
+                yield f"data: {json_dumps(end_stream_data)}\n\n"
                 
                 print(f"🎯 流式对话完成: {session_id}")
                 print(f"   - 总数据条数: {data_sent_count}")
@@ -1181,18 +1193,15 @@ async def stream_thoughts(session_id: str):
                 asyncio.create_task(delayed_cleanup())
                     
             except Exception as e:
-                # 确保time模块可用
-                import time
                 print(f"❌ 流式思考过程异常: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("流式思考过程异常")
                 
                 error_data = {
                     "type": "error",
                     "message": f"处理过程发生错误: {str(e)}",
                     "timestamp": time.time()
                 }
-                yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
+                yield f"data: {json_dumps(error_data)}\n\n"
             
             finally:
                 # 确保恢复原始 stdout
@@ -1202,12 +1211,7 @@ async def stream_thoughts(session_id: str):
         return StreamingResponse(
             thought_stream(),
             media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "*"
-            }
+            headers=SSE_HEADERS
         )
         
     except HTTPException:
@@ -1263,18 +1267,11 @@ async def get_projects_api(status: Optional[str] = None, http_req: Request = Non
         user_id = get_current_user(http_req, db)
         if not user_id:
             raise HTTPException(status_code=401, detail="未登录")
-        all_projects = get_all_projects(db, status=status)
-        from database.crud import list_project_members
-        # 管理员可见所有项目
+        # 管理员可见所有项目，普通用户只查询其参与的项目（单条SQL，避免逐项目查询成员）
         if user_is_admin(user_id):
-            projects = all_projects
+            projects = get_all_projects(db, status=status)
         else:
-            visible = []
-            for p in all_projects:
-                members = list_project_members(db, p.id)
-                if any(m.user_id == user_id for m in members):
-                    visible.append(p)
-            projects = visible
+            projects = get_projects_for_user(db, user_id, status=status)
         return ProjectListResponse(
             success=True,
             projects=[p.to_dict() for p in projects],
@@ -87,20 +87,19 @@ class MinIOUploader:
             return None, error_msg
             
         try:
-            # 验证文件存在
-            if not os.path.exists(file_path):
-                error_msg = f"文件不存在: {file_path}"
-                logger.error(f"❌ {error_msg}")
-                return None, error_msg
-            
             # 验证是PDF文件
             if not original_filename.lower().endswith('.pdf'):
                 error_msg = f"不是PDF文件: {original_filename}"
                 logger.error(f"❌ {error_msg}")
                 return None, error_msg
             
-            # 获取原始文件大小和校验和
-            file_stat = os.stat(file_path)
+            # 验证文件存在并获取原始文件大小（一次stat，不再单独exists检查）
+            try:
+                file_stat = os.stat(file_path)
+            except FileNotFoundError:
+                error_msg = f"文件不存在: {file_path}"
+                logger.error(f"❌ {error_msg}")
+                return None, error_msg
             original_size = file_stat.st_size
             logger.info(f"📄 原始文件大小: {original_size} 字节")
             
@@ -158,10 +157,11 @@ class MinIOUploader:
             return None, error_msg
     
     def _calculate_md5(self, file_path: str) -> str:
-        """计算文件的MD5校验和"""
+        """计算文件的MD5校验和（需与MinIO单段上传的ETag比对，故保留MD5）"""
         hash_md5 = hashlib.md5()
         with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+            # 1MB分块读取，减少大文件时的系统调用和Python循环次数
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
                 hash_md5.update(chunk)
         return hash_md5.hexdigest()
     
@@ -2,15 +2,73 @@
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+import asyncio
+import functools
+import time
 import httpx
-import json
+from collections import OrderedDict
 from deepseek_client import DeepSeekClient
+from json_utils import json_dumps, json_loads
 from qwen_client import QwenClient
 
 # 创建路由器
 router = APIRouter(prefix="/api/ai-editor", tags=["ai-editor"])
 
+# 编辑请求 -> 提取的关键词（LRU），相同请求重复编辑时省去一次DeepSeek调用
+_KEYWORD_CACHE_SIZE = 256
+_keyword_cache: "OrderedDict[str, str]" = OrderedDict()
+
+# (query, project_name, search_type, top_k) -> (过期时间, RAG结果文本)（LRU + TTL）
+# 短时间内对同一项目重复编辑时直接复用RAG结果；项目文档上传/解析后由 invalidate_rag_cache 清除
+_RAG_CACHE_SIZE = 256
+_RAG_CACHE_TTL = 300  # 秒
+_rag_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+def invalidate_rag_cache(project_name: Optional[str] = None):
+    """
+    清除RAG结果缓存（项目文档上传或解析完成后调用）
+    
+    Args:
+        project_name: 只清除该项目的缓存；为空时清除全部缓存
+    """
+    if project_name is None:
+        _rag_cache.clear()
+        return
+    # 可能在Agent工作线程中调用，先复制键列表再逐个删除
+    for key in list(_rag_cache):
+        if key[1] == project_name:
+            _rag_cache.pop(key, None)
+
+# RAG搜索共用的HTTP客户端，保持到RAG服务的keep-alive连接
+_rag_http_client: httpx.AsyncClient = None
+
+def _get_rag_http_client() -> httpx.AsyncClient:
+    """获取共用的RAG搜索HTTP客户端（首次使用时创建）"""
+    global _rag_http_client
+    if _rag_http_client is None or _rag_http_client.is_closed:
+        _rag_http_client = httpx.AsyncClient(timeout=30.0)
+    return _rag_http_client
+
+@functools.lru_cache(maxsize=None)
+def _get_deepseek_client() -> DeepSeekClient:
+    """获取进程内共用的DeepSeek客户端（首次使用时创建，缺少密钥时不缓存异常）"""
+    return DeepSeekClient()
+
+@functools.lru_cache(maxsize=None)
+def _get_qwen_client() -> QwenClient:
+    """获取进程内共用的Qwen客户端（首次使用时创建，缺少密钥时不缓存异常）"""
+    return QwenClient()
+
+async def close_clients():
+    """关闭AI编辑器共用的HTTP连接（应用关闭时调用）"""
+    global _rag_http_client
+    if _rag_http_client is not None and not _rag_http_client.is_closed:
+        await _rag_http_client.aclose()
+    _rag_http_client = None
+    if _get_deepseek_client.cache_info().currsize:
+        await _get_deepseek_client().close()
+
 @router.get("/test")
 async def test_route():
     """测试路由是否工作"""
@@ -77,22 +135,30 @@ async def ai_editor(plain_text: List[str], request: str, project_name: str, sear
     Returns:
         编辑后的结果
     """
+    # 原始request的RAG搜索不依赖关键词，先行发起，与关键词提取重叠进行
+    rag_original_task = asyncio.create_task(get_rag_info(request, project_name, search_type, 5))
     try:
-        # 1. 使用DeepSeek客户端提取关键词
-        deepseek_client = DeepSeekClient()
-        keywords = await extract_keywords_from_request(deepseek_client, request)
-        
-        # 2. 进行两次RAG搜索
-        # 第一次：使用关键词搜索
-        rag_info_keywords = await get_rag_info(keywords, project_name, search_type, 5)
+        # 1. 使用DeepSeek客户端提取关键词（命中缓存则直接复用）
+        keywords = _keyword_cache.get(request)
+        if keywords is not None:
+            _keyword_cache.move_to_end(request)
+        else:
+            keywords = await extract_keywords_from_request(_get_deepseek_client(), request)
+            # 提取失败时回退为原始请求，不缓存，下次重新尝试
+            if keywords != request:
+                _keyword_cache[request] = keywords
+                if len(_keyword_cache) > _KEYWORD_CACHE_SIZE:
+                    _keyword_cache.popitem(last=False)
         
-        # 第二次：使用原始request搜索
-        rag_info_original = await get_rag_info(request, project_name, search_type, 5)
+        # 2. 两次RAG搜索：关键词搜索 + 已在进行中的原始request搜索
+        rag_info_keywords, rag_info_original = await asyncio.gather(
+            get_rag_info(keywords, project_name, search_type, 5),
+            rag_original_task
+        )
         
         # 3. 使用Qwen-long模型生成优化后的文本
-        qwen_client = QwenClient()
         optimized_text = await generate_optimized_text(
-            qwen_client=qwen_client,
+            qwen_client=_get_qwen_client(),
             plain_text=plain_text,
             request=request,
             keywords=keywords,
@@ -120,6 +186,10 @@ async def ai_editor(plain_text: List[str], request: str, project_name: str, sear
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI编辑器处理失败: {str(e)}")
+    finally:
+        # 出错或请求被取消（客户端断开）时，不再让提前发起的RAG搜索在后台继续运行
+        if not rag_original_task.done():
+            rag_original_task.cancel()
 
 
 async def get_rag_info(query: str, project_name: str, search_type: str = "hybrid", top_k: int = 5) -> str:
@@ -135,6 +205,16 @@ async def get_rag_info(query: str, project_name: str, search_type: str = "hybrid
     Returns:
         RAG搜索结果的字符串表示
     """
+    # 命中未过期的缓存则直接返回，不再请求RAG服务
+    cache_key = (query, project_name, search_type, top_k)
+    cached = _rag_cache.get(cache_key)
+    if cached is not None:
+        expires_at, cached_text = cached
+        if expires_at > time.monotonic():
+            _rag_cache.move_to_end(cache_key)
+            return cached_text
+        del _rag_cache[cache_key]
+    
     try:
         # 构建请求数据
         request_data = {
@@ -144,23 +224,28 @@ async def get_rag_info(query: str, project_name: str, search_type: str = "hybrid
             "top_k": top_k
         }
         
-        # 调用外部RAG API
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "http://43.139.19.144:8001/api/v1/search",
-                headers={
-                    "accept": "application/json",
-                    "Content-Type": "application/json"
-                },
-                json=request_data
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                # 将结果转换为字符串格式
-                return json.dumps(result, ensure_ascii=False, indent=2)
-            else:
-                return f"RAG API调用失败: HTTP {response.status_code} - {response.text}"
+        # 调用外部RAG API（复用共用客户端的连接池）
+        client = _get_rag_http_client()
+        response = await client.post(
+            "http://43.139.19.144:8001/api/v1/search",
+            headers={
+                "accept": "application/json",
+                "Content-Type": "application/json"
+            },
+            json=request_data
+        )
+        
+        if response.status_code == 200:
+            result = json_loads(response.content)
+            # 将结果转换为字符串格式
+            result_text = json_dumps(result, indent=True)
+            # 只缓存成功的结果，失败时下次重新请求
+            _rag_cache[cache_key] = (time.monotonic() + _RAG_CACHE_TTL, result_text)
+            if len(_rag_cache) > _RAG_CACHE_SIZE:
+                _rag_cache.popitem(last=False)
+            return result_text
+        else:
+            return f"RAG API调用失败: HTTP {response.status_code} - {response.text}"
                 
     except Exception as e:
         return f"RAG API调用异常: {str(e)}"
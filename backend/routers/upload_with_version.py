@@ -3,25 +3,36 @@ from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from minio.commonconfig import CopySource
 from minio.error import S3Error
+import functools
 import logging
-import io
 import os
 
-# 这是一个假设，我们假设主应用中有一个已经配置好的minio_client实例
-# 通常这个实例会在应用的入口文件（如main.py）中创建并传递
-# 这里我们先从上级目录的minio_client.py导入
-try:
-    from ..minio_client import minio_client
-except (ImportError, ValueError):
-    # 如果直接运行此文件或结构不同，提供一个备用方案
-    from minio import Minio
-    logging.warning("Could not import minio_client from parent, creating a new instance.")
-    minio_client = Minio(
-        os.getenv("MINIO_API_HOST", "43.139.19.144:9000"),
-        access_key=os.getenv("MINIO_ACCESS_KEY", "minioadmin"),
-        secret_key=os.getenv("MINIO_SECRET_KEY", "minioadmin"),
-        secure=False
-    )
+from .ai_editor import invalidate_rag_cache
+
+
+@functools.lru_cache(maxsize=None)
+def get_minio_client():
+    """
+    获取MinIO客户端（首次调用时创建，之后复用同一实例）
+    
+    延迟到第一次请求时再创建，导入路由模块时不做任何MinIO相关工作
+    """
+    # 这是一个假设，我们假设主应用中有一个已经配置好的minio_client实例
+    # 通常这个实例会在应用的入口文件（如main.py）中创建并传递
+    # 这里我们先从上级目录的minio_client.py导入
+    try:
+        from ..minio_client import minio_client
+        return minio_client
+    except (ImportError, ValueError):
+        # 如果直接运行此文件或结构不同，提供一个备用方案
+        from minio import Minio
+        logging.warning("Could not import minio_client from parent, creating a new instance.")
+        return Minio(
+            os.getenv("MINIO_API_HOST", "43.139.19.144:9000"),
+            access_key=os.getenv("MINIO_ACCESS_KEY", "minioadmin"),
+            secret_key=os.getenv("MINIO_SECRET_KEY", "minioadmin"),
+            secure=False
+        )
 
 
 router = APIRouter()
@@ -37,6 +48,54 @@ ALLOWED_CONTENT_TYPES = {
     "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx"
 }
 
+# 存储桶是否已确认存在且启用版本控制（进程内只需检查一次，避免每次上传多两次请求）
+_bucket_ready = False
+
+
+def _ensure_versioned_bucket():
+    """确保存储桶存在并启用了版本控制，确认后在进程内缓存结果"""
+    global _bucket_ready
+    if _bucket_ready:
+        return
+
+    minio_client = get_minio_client()
+    found = minio_client.bucket_exists(BUCKET_NAME)
+    if not found:
+        minio_client.make_bucket(BUCKET_NAME)
+        logger.info(f"存储桶 '{BUCKET_NAME}' 已创建。")
+        # 启用版本控制
+        minio_client.set_bucket_versioning(BUCKET_NAME, {"Status": "Enabled"})
+        logger.info(f"存储桶 '{BUCKET_NAME}' 已启用版本控制。")
+    else:
+        # 检查版本控制状态，以防万一存储桶已存在但未启用版本控制
+        versioning_status = minio_client.get_bucket_versioning(BUCKET_NAME)
+        if getattr(versioning_status, 'status', None) != "Enabled":
+            minio_client.set_bucket_versioning(BUCKET_NAME, {"Status": "Enabled"})
+            logger.info(f"检测到版本控制未启用，现已为存储桶 '{BUCKET_NAME}' 启用。")
+
+    _bucket_ready = True
+
+
+def _get_upload_stream(file: UploadFile):
+    """
+    获取上传文件的底层文件对象及其大小
+
+    UploadFile 已由框架落盘/暂存在 SpooledTemporaryFile 中，直接把该文件对象交给
+    put_object 分片读取，避免再整体读入内存并复制一份 BytesIO
+    """
+    stream = file.file
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return stream, size
+
+
+def _reset_bucket_state(exc: S3Error):
+    """存储桶被外部删除时清除缓存，下次上传重新检查"""
+    global _bucket_ready
+    if exc.code == "NoSuchBucket":
+        _bucket_ready = False
+
 @router.post("/api/uploadwithversion", tags=["File Upload with Versioning"])
 async def upload_with_versioning(file: UploadFile = File(...)):
     """
@@ -52,25 +111,13 @@ async def upload_with_versioning(file: UploadFile = File(...)):
         )
 
     try:
+        minio_client = get_minio_client()
+
         # 2. 确保存储桶存在并启用了版本控制
-        found = minio_client.bucket_exists(BUCKET_NAME)
-        if not found:
-            minio_client.make_bucket(BUCKET_NAME)
-            logger.info(f"存储桶 '{BUCKET_NAME}' 已创建。")
-            # 启用版本控制
-            minio_client.set_bucket_versioning(BUCKET_NAME, {"Status": "Enabled"})
-            logger.info(f"存储桶 '{BUCKET_NAME}' 已启用版本控制。")
-        else:
-            # 检查版本控制状态，以防万一存储桶已存在但未启用版本控制
-            versioning_status = minio_client.get_bucket_versioning(BUCKET_NAME)
-            if versioning_status.status != "Enabled":
-                 minio_client.set_bucket_versioning(BUCKET_NAME, {"Status": "Enabled"})
-                 logger.info(f"检测到版本控制未启用，现已为存储桶 '{BUCKET_NAME}' 启用。")
-
-        # 3. 将文件内容读入内存
-        file_content = await file.read()
-        file_size = len(file_content)
-        file_stream = io.BytesIO(file_content)
+        _ensure_versioned_bucket()
+
+        # 3. 直接使用上传文件的底层流（不整体读入内存）
+        file_stream, file_size = _get_upload_stream(file)
 
         # 4. 上传文件
         object_name = file.filename
@@ -85,6 +132,8 @@ async def upload_with_versioning(file: UploadFile = File(...)):
         logger.info(
             f"成功将 '{object_name}' (版本ID: {result.version_id}) 上传到存储桶 '{BUCKET_NAME}'。"
         )
+        # 上传的文件不关联具体项目，清除全部RAG结果缓存
+        invalidate_rag_cache()
 
         # 5. 返回成功响应
         return {
@@ -97,6 +146,7 @@ async def upload_with_versioning(file: UploadFile = File(...)):
 
     except S3Error as exc:
         logger.error(f"MinIO S3 错误: {exc}")
+        _reset_bucket_state(exc)
         raise HTTPException(status_code=500, detail=f"发生 S3 错误: {exc}")
     except Exception as exc:
         logger.error(f"发生意外错误: {exc}")
@@ -121,23 +171,13 @@ async def uploadfile_with_return_url(file: UploadFile = File(...)):
         )
 
     try:
+        minio_client = get_minio_client()
+
         # 2. 确保存储桶存在并启用版本控制
-        found = minio_client.bucket_exists(BUCKET_NAME)
-        if not found:
-            minio_client.make_bucket(BUCKET_NAME)
-            logger.info(f"存储桶 '{BUCKET_NAME}' 已创建。")
-            minio_client.set_bucket_versioning(BUCKET_NAME, {"Status": "Enabled"})
-            logger.info(f"存储桶 '{BUCKET_NAME}' 已启用版本控制。")
-        else:
-            versioning_status = minio_client.get_bucket_versioning(BUCKET_NAME)
-            if getattr(versioning_status, 'status', None) != "Enabled":
-                minio_client.set_bucket_versioning(BUCKET_NAME, {"Status": "Enabled"})
-                logger.info(f"检测到版本控制未启用，现已为存储桶 '{BUCKET_NAME}' 启用。")
-
-        # 3. 读取文件内容
-        file_content = await file.read()
-        file_size = len(file_content)
-        file_stream = io.BytesIO(file_content)
+        _ensure_versioned_bucket()
+
+        # 3. 直接使用上传文件的底层流（不整体读入内存）
+        file_stream, file_size = _get_upload_stream(file)
 
         # 4. 上传对象（使用原始文件名；若重名将产生新版本）
         object_name = file.filename
@@ -152,6 +192,8 @@ async def uploadfile_with_return_url(file: UploadFile = File(...)):
         logger.info(
             f"成功上传 '{object_name}' (version_id: {getattr(result, 'version_id', None)}) 到 '{BUCKET_NAME}'"
         )
+        # 上传的文件不关联具体项目，清除全部RAG结果缓存
+        invalidate_rag_cache()
 
         # 5. 组装多种可用URL
         minio_uri = f"minio://{BUCKET_NAME}/{object_name}"
@@ -184,6 +226,7 @@ async def uploadfile_with_return_url(file: UploadFile = File(...)):
 
     except S3Error as exc:
         logger.error(f"MinIO S3 错误: {exc}")
+        _reset_bucket_state(exc)
         raise HTTPException(status_code=500, detail=f"发生 S3 错误: {exc}")
     except Exception as exc:
         logger.error(f"发生意外错误: {exc}")
@@ -195,6 +238,8 @@ async def get_file_versions(filename: str):
     获取指定文件的所有版本信息。
     """
     try:
+        minio_client = get_minio_client()
+
         # 1. 检查存储桶是否存在
         if not minio_client.bucket_exists(BUCKET_NAME):
             raise HTTPException(status_code=404, detail=f"存储桶 '{BUCKET_NAME}' 不存在。")
@@ -250,6 +295,8 @@ async def get_fileurlby_version(filename: str, version_id: str):
     获取文件特定版本的下载URL。
     """
     try:
+        minio_client = get_minio_client()
+
         # 1. 检查存储桶是否存在
         if not minio_client.bucket_exists(BUCKET_NAME):
             raise HTTPException(status_code=404, detail=f"存储桶 '{BUCKET_NAME}' 不存在。")
@@ -293,6 +340,8 @@ async def get_fileBinby_version(filename: str, version_id: str):
     获取文件特定版本的二进制文件。
     """
     try:
+        minio_client = get_minio_client()
+
         # 1. 检查存储桶是否存在
         if not minio_client.bucket_exists(BUCKET_NAME):
             raise HTTPException(status_code=404, detail=f"存储桶 '{BUCKET_NAME}' 不存在。")
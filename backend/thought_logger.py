@@ -2,11 +2,20 @@ import sys
 import asyncio
 import json
 import re
+import time
 from typing import Optional
 
 # 全局异步队列
 thought_queue = asyncio.Queue()
 
+# 预编译正则：ANSI颜色代码、迭代轮次
+_ANSI_ESCAPE_RE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+_ITERATION_RE = re.compile(r"第 (\d+) 轮")
+
+# 需要打印调试信息的关键词、结束Final Answer收集的行首标记（元组常量，避免每行输出都重新构建列表）
+_DEBUG_KEYWORDS = ("Thought:", "Action:", "Final Answer:", "Observation:")
+_SECTION_MARKERS = ("Thought:", "Action:", "Observation:", "--- 第")
+
 class ThoughtLogger:
     """拦截 stdout 输出，同时保持终端显示和推送到队列"""
     
@@ -46,20 +55,18 @@ class ThoughtLogger:
         if not message:
             return
             
-        # 移除ANSI颜色代码
-        import re
-        ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-        clean_message = ansi_escape.sub('', message)
+        # 移除ANSI颜色代码（不含转义符时跳过正则替换）
+        clean_message = _ANSI_ESCAPE_RE.sub('', message) if '\x1b' in message else message
         
         try:
             # 调试输出
-            if any(keyword in clean_message for keyword in ["Thought:", "Action:", "Final Answer:", "Observation:"]):
+            if any(keyword in clean_message for keyword in _DEBUG_KEYWORDS):
                 self._original_stdout.write(f"🔍 分析消息: '{clean_message}'\n")
             
             # 🆕 处理多行Final Answer收集
             if self._collecting_final_answer:
                 # 检查是否遇到新的标记，如果是则结束Final Answer收集
-                if any(clean_message.startswith(marker) for marker in ["Thought:", "Action:", "Observation:", "--- 第"]):
+                if clean_message.startswith(_SECTION_MARKERS):
                     # 推送完整的Final Answer
                     self._push_complete_final_answer()
                     # 重置收集状态
@@ -105,7 +112,7 @@ class ThoughtLogger:
                 self._original_stdout.write(f"🎯 开始收集Final Answer，初始内容: '{content}'\n")
             elif clean_message.startswith("--- 第") and clean_message.endswith("轮 ---"):
                 # 捕获迭代轮次
-                match = re.search(r"第 (\d+) 轮", clean_message)
+                match = _ITERATION_RE.search(clean_message)
                 if match:
                     iteration = int(match.group(1))
                     self._push_to_queue({
@@ -130,7 +137,6 @@ class ThoughtLogger:
     def _push_to_queue(self, data: dict):
         """推送数据到队列"""
         try:
-            import time
             data["timestamp"] = time.time()
             
             # 使用线程安全的方式推送
@@ -3,9 +3,10 @@
 专注于API工具调用，支持分布式工具部署
 """
 
-from .tool_registry import ToolRegistry, create_core_tool_registry
+from .tool_registry import ToolRegistry, create_core_tool_registry, close_api_session
 
 __all__ = [
     'ToolRegistry',
-    'create_core_tool_registry'
+    'create_core_tool_registry',
+    'close_api_session'
 ] 
\ No newline at end of file
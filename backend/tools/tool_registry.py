@@ -10,8 +10,34 @@ from typing import Dict, Any, List, Optional, Callable
 from abc import ABC, abstractmethod
 # �� 导入数据库模块用于查询文件
 from database.database import SessionLocal
-from database.crud import get_project_files, get_project_by_name
+from database.crud import get_project_by_name, get_latest_ready_pdf
 from database import models
+from json_utils import json_dumps, json_loads
+
+# 按事件循环复用的工具API会话，保持与工具服务的keep-alive连接
+# （会话本身引用着事件循环，不能依赖弱引用自动清理；由 close_api_session() 显式关闭，已关闭循环的残留项在创建新会话时清理）
+_api_sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+
+
+def _get_api_session() -> aiohttp.ClientSession:
+    """获取当前事件循环上复用的工具API会话"""
+    loop = asyncio.get_running_loop()
+    session = _api_sessions.get(loop)
+    if session is None or session.closed:
+        # 丢弃已关闭事件循环上遗留的会话（循环关闭后已无法再await关闭，只能释放引用）
+        for stale_loop, _ in list(_api_sessions.items()):
+            if stale_loop.is_closed():
+                _api_sessions.pop(stale_loop, None)
+        session = aiohttp.ClientSession()
+        _api_sessions[loop] = session
+    return session
+
+
+async def close_api_session():
+    """关闭当前事件循环上的工具API会话"""
+    session = _api_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
 
 class BaseTool(ABC):
     """工具基类"""
@@ -60,27 +86,19 @@ class APITool(BaseTool):
         try:
             print(f"🔍 查询项目'{project_name}'的PDF文件...")
             
-            # 获取项目文件列表
-            files = get_project_files(db, project_name=project_name)
-            
-            if not files:
-                print(f"⚠️ 项目'{project_name}'中没有找到任何文件")
+            project = get_project_by_name(db, project_name)
+            if not project:
+                print(f"⚠️ 项目'{project_name}'不存在")
                 return None
             
-            # 筛选PDF文件并按上传时间排序（最新的在前）
-            pdf_files = [
-                f for f in files 
-                if f.original_name.lower().endswith('.pdf') 
-                and f.minio_path 
-                and f.status == 'ready'
-            ]
+            # 由数据库筛选就绪的PDF并按上传时间取最新一条，不再加载项目全部文件
+            latest_pdf = get_latest_ready_pdf(db, project.id)
             
-            if not pdf_files:
+            if not latest_pdf:
                 print(f"⚠️ 项目'{project_name}'中没有找到已准备好的PDF文件")
                 return None
                 
             # 返回最新的PDF文件路径
-            latest_pdf = pdf_files[0]  # 已按上传时间降序排列
             print(f"✅ 找到最新PDF文件: {latest_pdf.original_name} -> {latest_pdf.minio_path}")
             return latest_pdf.minio_path
             
@@ -156,58 +174,55 @@ class APITool(BaseTool):
             }
             
             # 🚀 发送API请求
-            import aiohttp
-            import asyncio
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.api_url,
-                    json=request_payload,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=aiohttp.ClientTimeout(total=300)
-                ) as response:
-                    print(f"📡 API响应状态码: {response.status}")
+            session = _get_api_session()
+            async with session.post(
+                self.api_url,
+                json=request_payload,
+                headers={'Content-Type': 'application/json'},
+                timeout=aiohttp.ClientTimeout(total=300)
+            ) as response:
+                print(f"📡 API响应状态码: {response.status}")
+                
+                if response.status == 200:
+                    result = await response.json()
+                    print(f"✅ PDF解析API调用成功，状态码200")
+                    
+                    # 🎯 关键修改：200状态码就认为成功，不管业务逻辑success字段
+                    # 如果API返回了200，说明服务正常工作，即使业务逻辑有问题也是成功的调用
+                    print(f"📋 API返回数据: {json_dumps(result, indent=True)}")
+                    
+                    # 确保返回success=True，让Agent认为操作成功
+                    successful_result = {
+                        "success": True,
+                        "api_status": "成功",
+                        "http_status": 200,
+                        "data": result,
+                        "minio_url": http_url,
+                        "project_name": project_name,
+                        "message": "PDF解析API调用成功完成"
+                    }
+                    
+                    # 如果原始结果有success字段且为false，添加到响应中但不影响整体成功状态
+                    if not result.get("success", True):
+                        successful_result["business_note"] = "API调用成功，但服务返回了业务层面的处理信息"
+                        successful_result["original_business_status"] = result.get("success")
+                        successful_result["business_details"] = result.get("error", "无详细信息")
+                    
+                    return successful_result
+                else:
+                    error_text = await response.text()
+                    print(f"❌ PDF解析API调用失败: 状态码={response.status}, 错误={error_text}")
+                    return {
+                        "success": False,
+                        "error_type": "api_error",
+                        "http_status": response.status,
+                        "error_message": error_text,
+                        "api_url": self.api_url,
+                        "minio_url": http_url,
+                        "project_name": project_name,
+                        "instruction": "PDF解析API调用失败，请检查服务状态"
+                    }
                     
-                    if response.status == 200:
-                        result = await response.json()
-                        print(f"✅ PDF解析API调用成功，状态码200")
-                        
-                        # 🎯 关键修改：200状态码就认为成功，不管业务逻辑success字段
-                        # 如果API返回了200，说明服务正常工作，即使业务逻辑有问题也是成功的调用
-                        print(f"📋 API返回数据: {json.dumps(result, ensure_ascii=False, indent=2)}")
-                        
-                        # 确保返回success=True，让Agent认为操作成功
-                        successful_result = {
-                            "success": True,
-                            "api_status": "成功",
-                            "http_status": 200,
-                            "data": result,
-                            "minio_url": http_url,
-                            "project_name": project_name,
-                            "message": "PDF解析API调用成功完成"
-                        }
-                        
-                        # 如果原始结果有success字段且为false，添加到响应中但不影响整体成功状态
-                        if not result.get("success", True):
-                            successful_result["business_note"] = "API调用成功，但服务返回了业务层面的处理信息"
-                            successful_result["original_business_status"] = result.get("success")
-                            successful_result["business_details"] = result.get("error", "无详细信息")
-                        
-                        return successful_result
-                    else:
-                        error_text = await response.text()
-                        print(f"❌ PDF解析API调用失败: 状态码={response.status}, 错误={error_text}")
-                        return {
-                            "success": False,
-                            "error_type": "api_error",
-                            "http_status": response.status,
-                            "error_message": error_text,
-                            "api_url": self.api_url,
-                            "minio_url": http_url,
-                            "project_name": project_name,
-                            "instruction": "PDF解析API调用失败，请检查服务状态"
-                        }
-                        
         except Exception as e:
             print(f"❌ PDF解析API调用异常: {str(e)}")
             return {
@@ -261,70 +276,67 @@ class APITool(BaseTool):
                 "enable_review_and_regeneration": payload.get("enable_review_and_regeneration", True)
             }
             
-            print(f"📋 发送参数: {json.dumps(api_request, ensure_ascii=False)}")
+            print(f"📋 发送参数: {json_dumps(api_request)}")
             
             # 🚀 发送API请求到外部文档生成服务
-            import aiohttp
-            import asyncio
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.api_url,
-                    json=api_request,  # 发送标准字段: query, project_name, enable_review_and_regeneration
-                    headers={'Content-Type': 'application/json'},
-                    timeout=aiohttp.ClientTimeout(total=300)
-                ) as response:
-                    print(f"📡 文档生成API响应状态码: {response.status}")
+            session = _get_api_session()
+            async with session.post(
+                self.api_url,
+                json=api_request,  # 发送标准字段: query, project_name, enable_review_and_regeneration
+                headers={'Content-Type': 'application/json'},
+                timeout=aiohttp.ClientTimeout(total=300)
+            ) as response:
+                print(f"📡 文档生成API响应状态码: {response.status}")
+                
+                if response.status == 200:
+                    result = await response.json()
+                    print(f"✅ 文档生成API调用成功")
+                    print(f"📋 API返回数据: {json_dumps(result, indent=True)}")
+                    
+                    # 🎯 处理 DocumentGenerationResponse 格式
+                    task_id = result.get("task_id")
+                    status = result.get("status", "unknown")
+                    message = result.get("message", "文档生成任务已提交")
+                    files = result.get("files") or {}  # 处理null值
+                    minio_urls = result.get("minio_urls") or {}  # 处理null值
+                    
+                    # 构建标准化响应
+                    standardized_result = {
+                        "success": True,
+                        "api_status": "成功",
+                        "http_status": 200,
+                        "tool_name": "document_generator",
+                        "task_id": task_id,
+                        "status": status,
+                        "message": message,
+                        "files": files,
+                        "minio_urls": minio_urls,
+                        "download_info": self._format_download_info(files, minio_urls),
+                        "agent_message": f"文档生成任务已提交！{message}"
+                    }
+                    
+                    # 根据状态调整消息
+                    if status == "pending":
+                        standardized_result["agent_message"] = f"✅ 文档生成任务已提交！\n\n**任务信息：**\n- 任务ID: {task_id}\n- 状态: 处理中\n- 说明: {message}\n\n文档正在生成中，完成后将提供下载链接。"
+                    elif status == "completed" and minio_urls:
+                        standardized_result["has_downloads"] = True
+                        standardized_result["download_count"] = len(minio_urls)
+                        standardized_result["agent_message"] = f"✅ 文档生成完成！{message}"
+                    
+                    return standardized_result
+                else:
+                    error_text = await response.text()
+                    print(f"❌ 文档生成API调用失败: 状态码={response.status}, 错误={error_text}")
+                    return {
+                        "success": False,
+                        "error_type": "api_error",
+                        "http_status": response.status,
+                        "error_message": error_text,
+                        "api_url": self.api_url,
+                        "tool_name": "document_generator",
+                        "instruction": "文档生成API调用失败，请检查服务状态"
+                    }
                     
-                    if response.status == 200:
-                        result = await response.json()
-                        print(f"✅ 文档生成API调用成功")
-                        print(f"📋 API返回数据: {json.dumps(result, ensure_ascii=False, indent=2)}")
-                        
-                        # 🎯 处理 DocumentGenerationResponse 格式
-                        task_id = result.get("task_id")
-                        status = result.get("status", "unknown")
-                        message = result.get("message", "文档生成任务已提交")
-                        files = result.get("files") or {}  # 处理null值
-                        minio_urls = result.get("minio_urls") or {}  # 处理null值
-                        
-                        # 构建标准化响应
-                        standardized_result = {
-                            "success": True,
-                            "api_status": "成功",
-                            "http_status": 200,
-                            "tool_name": "document_generator",
-                            "task_id": task_id,
-                            "status": status,
-                            "message": message,
-                            "files": files,
-                            "minio_urls": minio_urls,
-                            "download_info": self._format_download_info(files, minio_urls),
-                            "agent_message": f"文档生成任务已提交！{message}"
-                        }
-                        
-                        # 根据状态调整消息
-                        if status == "pending":
-                            standardized_result["agent_message"] = f"✅ 文档生成任务已提交！\n\n**任务信息：**\n- 任务ID: {task_id}\n- 状态: 处理中\n- 说明: {message}\n\n文档正在生成中，完成后将提供下载链接。"
-                        elif status == "completed" and minio_urls:
-                            standardized_result["has_downloads"] = True
-                            standardized_result["download_count"] = len(minio_urls)
-                            standardized_result["agent_message"] = f"✅ 文档生成完成！{message}"
-                        
-                        return standardized_result
-                    else:
-                        error_text = await response.text()
-                        print(f"❌ 文档生成API调用失败: 状态码={response.status}, 错误={error_text}")
-                        return {
-                            "success": False,
-                            "error_type": "api_error",
-                            "http_status": response.status,
-                            "error_message": error_text,
-                            "api_url": self.api_url,
-                            "tool_name": "document_generator",
-                            "instruction": "文档生成API调用失败，请检查服务状态"
-                        }
-                        
         except Exception as e:
             print(f"❌ 文档生成API调用异常: {str(e)}")
             return {
@@ -387,7 +399,7 @@ class APITool(BaseTool):
             
             # 尝试解析FastAPI格式的错误详情
             try:
-                error_json = json.loads(error_text)
+                error_json = json_loads(error_text)
                 if isinstance(error_json, dict) and "detail" in error_json:
                     error_analysis.update(self._analyze_fastapi_error(error_json, payload))
             except json.JSONDecodeError:
@@ -440,7 +452,7 @@ class APITool(BaseTool):
             }
             
             print(f"🔧 调用工具API: {self.name} -> {self.api_url}")
-            print(f"📋 发送参数: {json.dumps(payload, ensure_ascii=False)}")
+            print(f"📋 发送参数: {json_dumps(payload)}")
             print(f"🏗️ 项目上下文: {self.project_context}")
             
             # 🧠 特殊处理PDF解析工具
@@ -455,60 +467,60 @@ class APITool(BaseTool):
             # if self.name == "check_project_state":
             #     return await self._execute_check_project_state(payload)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.api_url,
-                    json=payload,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=aiohttp.ClientTimeout(total=300)  # 设置为5分钟超时
-                ) as response:
-                    print(f"📡 API响应状态码: {response.status}")
+            session = _get_api_session()
+            async with session.post(
+                self.api_url,
+                json=payload,
+                headers={'Content-Type': 'application/json'},
+                timeout=aiohttp.ClientTimeout(total=300)  # 设置为5分钟超时
+            ) as response:
+                print(f"📡 API响应状态码: {response.status}")
+                
+                if response.status == 200:
+                    result = await response.json()
+                    print(f"✅ API调用成功")
+                    
+                    # 🎯 关键修复：确保200状态码响应包含success=true
+                    # 对于RAG工具等，API返回200就认为成功，包装成标准格式
+                    if not isinstance(result, dict):
+                        result = {"data": result}
                     
-                    if response.status == 200:
-                        result = await response.json()
-                        print(f"✅ API调用成功")
-                        
-                        # 🎯 关键修复：确保200状态码响应包含success=true
-                        # 对于RAG工具等，API返回200就认为成功，包装成标准格式
-                        if not isinstance(result, dict):
-                            result = {"data": result}
-                        
-                        # 如果没有success字段，添加success=true（因为HTTP状态码已经是200）
-                        if "success" not in result:
+                    # 如果没有success字段，添加success=true（因为HTTP状态码已经是200）
+                    if "success" not in result:
+                        result["success"] = True
+                        result["http_status"] = 200
+                        result["message"] = f"{self.name} API调用成功"
+                        print(f"🔧 自动添加success=true字段")
+                    
+                    # 如果有success字段但为false，检查是否有有效数据
+                    elif not result.get("success", True):
+                        # 如果有数据内容，仍然认为是成功的
+                        if any(key in result for key in ["data", "results", "documents", "items", "content"]):
                             result["success"] = True
                             result["http_status"] = 200
-                            result["message"] = f"{self.name} API调用成功"
-                            print(f"🔧 自动添加success=true字段")
-                        
-                        # 如果有success字段但为false，检查是否有有效数据
-                        elif not result.get("success", True):
-                            # 如果有数据内容，仍然认为是成功的
-                            if any(key in result for key in ["data", "results", "documents", "items", "content"]):
-                                result["success"] = True
-                                result["http_status"] = 200
-                                result["original_success"] = False
-                                result["message"] = f"{self.name} API调用成功，已获取数据"
-                                print(f"🔧 检测到数据内容，强制设置success=true")
-                        
-                        print(f"📋 最终返回结果success状态: {result.get('success')}")
-                        return result
-                    else:
-                        error_text = await response.text()
-                        print(f"❌ API调用失败: 状态码={response.status}, 错误={error_text}")
-                        
-                        # 🧠 简化错误处理，让主Agent自己分析
-                        return {
-                            "success": False,
-                            "error_type": "api_error",
-                            "http_status": response.status,
-                            "error_message": error_text,
-                            "api_url": self.api_url,
-                            "sent_params": payload,
-                            "tool_name": self.name,
-                            "tool_parameters": self.parameters,
-                            "instruction": "请分析此API错误并决定如何处理"
-                        }
-                        
+                            result["original_success"] = False
+                            result["message"] = f"{self.name} API调用成功，已获取数据"
+                            print(f"🔧 检测到数据内容，强制设置success=true")
+                    
+                    print(f"📋 最终返回结果success状态: {result.get('success')}")
+                    return result
+                else:
+                    error_text = await response.text()
+                    print(f"❌ API调用失败: 状态码={response.status}, 错误={error_text}")
+                    
+                    # 🧠 简化错误处理，让主Agent自己分析
+                    return {
+                        "success": False,
+                        "error_type": "api_error",
+                        "http_status": response.status,
+                        "error_message": error_text,
+                        "api_url": self.api_url,
+                        "sent_params": payload,
+                        "tool_name": self.name,
+                        "tool_parameters": self.parameters,
+                        "instruction": "请分析此API错误并决定如何处理"
+                    }
+                    
         except asyncio.TimeoutError:
             return {
                 "success": False,
@@ -545,6 +557,8 @@ class ToolRegistry:
     def __init__(self, project_context: Optional[Dict[str, Any]] = None):
         self.tools: Dict[str, BaseTool] = {}
         self.project_context = project_context or {}
+        # 工具描述文本缓存（与项目上下文无关，注册新工具时失效）
+        self._tools_description: Optional[str] = None
         
     def set_project_context(self, project_context: Dict[str, Any]):
         """设置项目上下文"""
@@ -558,6 +572,7 @@ class ToolRegistry:
         """注册API工具"""
         tool = APITool(name, description, parameters, api_url, self.project_context)
         self.tools[name] = tool
+        self._tools_description = None
         print(f"📝 注册API工具: {name} -> {api_url}")
         
     async def execute_tool(self, name: str, **kwargs) -> Dict[str, Any]:
@@ -585,13 +600,17 @@ class ToolRegistry:
         
     def get_tools_description(self) -> str:
         """获取所有工具的描述"""
+        if self._tools_description is not None:
+            return self._tools_description
+        
         descriptions = []
         for tool in self.tools.values():
             info = tool.get_info()
             param_desc = json.dumps(info["parameters"], ensure_ascii=False, indent=2)
             descriptions.append(f"工具名: {info['name']}\n描述: {info['description']}\n参数: {param_desc}")
             
-        return "\n\n".join(descriptions)
+        self._tools_description = "\n\n".join(descriptions)
+        return self._tools_description
         
     def list_tools(self) -> List[Dict[str, Any]]:
         """列出所有工具"""